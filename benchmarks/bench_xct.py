@@ -0,0 +1,197 @@
+#Benchmarks of the app, offline against the fixture table in benchmarks/fixtures (synthetic attenuation coefficients with a
+#photoelectric + scattering model, not measured data, so the results of the app are not meaningful, only the timings).
+#Every case is timed over a sweep of phase mixes, diameters and filter options; wall time (median of the repeats) and peak
+#memory (tracemalloc) are compared with benchmarks/baselines.json and the script exits with 1 on a regression.
+#
+#   python benchmarks/bench_xct.py                   # compare with the baselines
+#   python benchmarks/bench_xct.py --update          # store the current results as the new baselines
+#   python benchmarks/bench_xct.py --case transmission --threshold 0.5
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE=os.path.dirname(os.path.abspath(__file__))
+ROOT=os.path.dirname(HERE)
+FIXTURE=os.path.join(HERE,'fixtures','attenuation.csv')
+BASELINES=os.path.join(HERE,'baselines.json')
+APP=os.path.join(ROOT,'xct_explorer_270824.py')
+
+########### the app must never contact google sheets: serve a snapshot of the fixture in offline mode
+SNAPSHOT_DIR=tempfile.mkdtemp(prefix='xct-bench-')
+os.environ['XCT_SNAPSHOT_DIR']=SNAPSHOT_DIR
+os.environ['XCT_OFFLINE']='1'
+sys.path.insert(0,ROOT)
+
+import numpy as np
+import pandas as pd
+import xct_engine
+import xct_database
+import xct_charts
+import xct_planner
+import xct_uncertainty
+
+DATABASE=pd.read_csv(FIXTURE)
+xct_database.write_snapshot(DATABASE,SNAPSHOT_DIR)
+PHASE_TABLE=xct_engine.PhaseTable.from_frame(DATABASE)
+
+########### sweep: phase mixes x diameters x filter options
+MIXES=[(('Air','Quartz'),(0.1,0.9)),
+       (('Air','Calcite','Dolomite'),(0.2,0.5,0.3)),
+       (('Water','Quartz','Feldspar','Clay','Pyrite'),(0.15,0.5,0.2,0.1,0.05)),
+       (('Resin','Hematite','Barite'),(0.6,0.3,0.1))]
+DIAMETERS=(5,20,80,150)
+SWEEP=[(phases,fractions,diameter,filterMode) for phases,fractions in MIXES for diameter in DIAMETERS for filterMode in xct_engine.FILTER_MODES]
+
+def transmission_case():
+    ########### transmission and filter thickness of the app, for every point of the sweep
+    for phases,fractions,diameter,filterMode in SWEEP:
+        totalTransm=PHASE_TABLE.transmission(phases,fractions,diameter)
+        _,_,att10,att1=xct_engine.filter_attenuation(PHASE_TABLE.energy,totalTransm,PHASE_TABLE[xct_engine.FILTER_PHASE])
+        xct_engine.filter_thickness(filterMode,att10,att1)
+
+def curve_fit_case():
+    ########### the same with the curve fit of previous versions of the app (scipy.optimize.curve_fit)
+    for phases,fractions,diameter,filterMode in SWEEP:
+        totalTransm=PHASE_TABLE.transmission(phases,fractions,diameter)
+        _,_,att10,att1=xct_engine.filter_attenuation_fit(PHASE_TABLE.energy,totalTransm,PHASE_TABLE[xct_engine.FILTER_PHASE])
+        xct_engine.filter_thickness(filterMode,att10,att1)
+
+SPECTRUM_TABLE=xct_engine.SpectrumTable.from_phase_table(PHASE_TABLE)
+
+def spectrum_case():
+    ########### effective transmission and beam hardening for every Emax step and filter thickness of the sweep
+    for phases,fractions,diameter,filterMode in SWEEP:
+        SPECTRUM_TABLE.evaluate(PHASE_TABLE.transmission(phases,fractions,diameter))
+
+def plan_case():
+    ########### the whole sweep in one vectorized call, for every binning and detector width
+    weights=np.stack([PHASE_TABLE.weights(phases,fractions) for phases,fractions in MIXES])
+    for binning in xct_engine.BINNINGS:
+        for detector in xct_engine.DETECTORS:
+            for filterMode in xct_engine.FILTER_MODES:
+                diameter=np.array(DIAMETERS,dtype=float)[:,None]
+                xct_engine.plan(diameter,binning,detector,'Quantify',weights[None,:,:],PHASE_TABLE.attenuation,
+                                PHASE_TABLE.energy,PHASE_TABLE[xct_engine.FILTER_PHASE],filterMode,160)
+
+def planner_case():
+    for phases,fractions in MIXES:
+        xct_planner.search(PHASE_TABLE,phases,fractions,'Quantify',60,24)
+
+def uncertainty_case():
+    ########### Monte Carlo draws (xct_uncertainty.DRAWS) of every phase mix and diameter
+    for phases,fractions in MIXES:
+        for diameter in DIAMETERS:
+            xct_uncertainty.bands(xct_uncertainty.simulate(PHASE_TABLE,phases,fractions,diameter,2,1920))
+
+def geometry_chart_case():
+    ########### construction and serialization (what streamlit sends to the browser) of the chart of the geometric tab
+    for diameter in DIAMETERS:
+        for binning in xct_engine.BINNINGS:
+            for detector in xct_engine.DETECTORS:
+                xct_charts.geometry_chart(int(xct_engine.voxel_size(diameter,binning,detector)),diameter).to_dict()
+
+def attenuation_chart_case():
+    for phases,_ in MIXES:
+        xct_charts.attenuation_chart(xct_charts.attenuation_data(DATABASE,phases),phases).to_dict()
+
+def transmission_chart_case():
+    for phases,fractions,diameter,filterMode in SWEEP[::len(xct_engine.FILTER_MODES)]:
+        totalTransm=PHASE_TABLE.transmission(phases,fractions,diameter)
+        xct_charts.transmission_chart(xct_charts.transmission_data(pd.DataFrame({'Energy (kV)':PHASE_TABLE.energy,'Sample':totalTransm,
+                                                                                 'Filter':totalTransm,'Filter+Sample':totalTransm}))).to_dict()
+
+def _widget(elements, label):
+    return next(element for element in elements if element.label==label)
+
+def app_case():
+    ########### full reruns of the script: first run, then a change of each kind of widget
+    from streamlit.testing.v1 import AppTest
+    app=AppTest.from_file(APP,default_timeout=120)
+    app.run()
+    for phases,fractions in MIXES[:2]:
+        _widget(app.multiselect,'Phases').set_value(list(phases)).run()
+        for phase,fraction in zip(phases,fractions):
+            app.number_input(key=f'fraction_{phase}').set_value(fraction).run()
+        for diameter in DIAMETERS[1:3]:
+            _widget(app.slider,' ').set_value(diameter).run()
+        for filterMode in xct_engine.FILTER_MODES:
+            _widget(app.radio,'Filter').set_value(filterMode).run()
+        _widget(app.slider,'Maximum Energy (kV)').set_value(120).run()
+    if app.exception:
+        raise RuntimeError(app.exception[0].value)
+
+CASES={'transmission':(transmission_case,20),
+       'curve_fit':(curve_fit_case,5),
+       'spectrum':(spectrum_case,20),
+       'plan':(plan_case,20),
+       'planner':(planner_case,5),
+       'uncertainty':(uncertainty_case,5),
+       'geometry_chart':(geometry_chart_case,5),
+       'attenuation_chart':(attenuation_chart_case,10),
+       'transmission_chart':(transmission_chart_case,10),
+       'app':(app_case,2)}                                   # case: (function, repeats)
+NOISY_MEMORY=('app',)          # the tracemalloc peak of full AppTest reruns varies by ~40% between runs, only the time is compared
+
+def measure(function, repeats):
+    function()                                              # warm up (imports, caches of streamlit)
+    times=[]
+    for _ in range(repeats):
+        start=time.perf_counter()
+        function()
+        times.append(time.perf_counter()-start)
+    tracemalloc.start()
+    function()
+    _,peak=tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'median_s':statistics.median(times),'min_s':min(times),'peak_mb':peak/2**20,'repeats':repeats}
+
+def main():
+    parser=argparse.ArgumentParser(description='Benchmarks of XCT Explorer')
+    parser.add_argument('--case',action='append',choices=sorted(CASES),help='run only this case (repeatable)')
+    parser.add_argument('--threshold',type=float,default=0.3,help='allowed relative increase over the baseline (default 0.3)')
+    parser.add_argument('--update',action='store_true',help='store the results as the new baselines')
+    args=parser.parse_args()
+    try:
+        with open(BASELINES) as file:
+            baselines=json.load(file)
+    except OSError:
+        baselines={'cases':{}}
+    results={}
+    regressions=[]
+    print(f'{"case":<20}{"median (ms)":>13}{"min (ms)":>11}{"peak (MB)":>11}{"baseline (ms)":>15}{"change":>9}')
+    for name in args.case or CASES:
+        function,repeats=CASES[name]
+        result=results[name]=measure(function,repeats)
+        baseline=baselines['cases'].get(name)
+        change=''
+        if baseline:
+            timeChange=result['median_s']/baseline['median_s']-1
+            memoryChange=result['peak_mb']/baseline['peak_mb']-1 if baseline['peak_mb'] else 0
+            change=f'{timeChange:+.0%}'
+            if timeChange>args.threshold:
+                regressions.append(f'{name}: wall time {timeChange:+.0%}')
+            if memoryChange>args.threshold and name not in NOISY_MEMORY:
+                regressions.append(f'{name}: peak memory {memoryChange:+.0%}')
+        print(f'{name:<20}{result["median_s"]*1e3:>13.1f}{result["min_s"]*1e3:>11.1f}{result["peak_mb"]:>11.2f}'
+              f'{baseline["median_s"]*1e3 if baseline else float("nan"):>15.1f}{change:>9}')
+    if args.update:
+        baselines['cases'].update(results)
+        baselines['machine']={'python':platform.python_version(),'numpy':np.__version__,'platform':platform.platform()}
+        with open(BASELINES,'w') as file:
+            json.dump(baselines,file,indent=2,sort_keys=True)
+            file.write('\n')
+        print(f'Baselines written to {BASELINES}')
+        return 0
+    if regressions:
+        print(f'Regressions over {args.threshold:.0%}:\n  '+'\n  '.join(regressions))
+        return 1
+    return 0
+
+if __name__=='__main__':
+    sys.exit(main())
@@ -0,0 +1,23 @@
+import os
+import sys
+import tempfile
+
+ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,ROOT)
+os.environ.setdefault('XCT_SNAPSHOT_DIR',tempfile.mkdtemp(prefix='xct-tests-'))   # cache of the scanner profiles
+os.environ.setdefault('XCT_OFFLINE','1')
+
+import pandas as pd
+import pytest
+
+FIXTURE=os.path.join(ROOT,'benchmarks','fixtures','attenuation.csv')
+
+@pytest.fixture(scope='session')
+def database():
+    ########### synthetic table of attenuation coefficients of the benchmarks, same layout as the app database
+    return pd.read_csv(FIXTURE)
+
+@pytest.fixture(scope='session')
+def phase_table(database):
+    import xct_engine
+    return xct_engine.PhaseTable.from_frame(database)
@@ -0,0 +1,64 @@
+#Campaign CLI: validation of the rows, planning of a chunk with good and bad rows, and the same results with one process
+#or a pool of workers.
+import io
+import json
+import math
+import pytest
+import xct_campaign
+from conftest import FIXTURE
+
+DEFAULTS={'scanner':'CoreTom','binning':'2','detector':'1920','filter':'Ideal','maximum_energy':'160','scans':'1'}
+ROWS=[{'diameter':'20','phases':'Quartz;Calcite','fractions':'0.5;0.3','purpose':'Quantify','binning':'2x'},
+      {'diameter':'nan','phases':'Quartz','fractions':'0.9','purpose':'Classify'},
+      {'diameter':'50','phases':'Quartz','fractions':'0.9','purpose':'Classify','maximum_energy':'inf'},
+      {'diameter':'10','phases':'Unobtainium','fractions':'0.5','purpose':'Qualitative'},
+      {'diameter':'5','phases':'Pyrite;Resin','fractions':'0.1;0.8','purpose':'Qualitative','filter':'Fast','scans':'3'}]
+
+@pytest.fixture(scope='module')
+def tables():
+    return xct_campaign.load_tables(FIXTURE)
+
+def test_parse_row():
+    sample=xct_campaign.parse_row(ROWS[0],DEFAULTS)
+    assert sample=={'scanner':'CoreTom','diameter':20.0,'purpose':'Quantify','binning':2,'detector':1920,'filter':'Ideal',
+                    'maximumEnergy':160.0,'scans':1,'phases':['Quartz','Calcite'],'fractions':[0.5,0.3]}
+
+@pytest.mark.parametrize('changes,message',[({'diameter':'nan'},'diameter'),({'diameter':'inf'},'diameter'),({'diameter':'0'},'diameter'),
+                                            ({'maximum_energy':'nan'},'maximum energy'),({'maximum_energy':'-inf'},'maximum energy'),
+                                            ({'scans':'0'},'scans'),({'fractions':'nan;0.3'},'fractions'),({'fractions':'0.5'},'fractions'),
+                                            ({'binning':'4'},'binning'),({'purpose':'Look'},'purpose'),({'phases':''},'phases')])
+def test_invalid_row(changes, message):
+    with pytest.raises(ValueError,match=message):
+        xct_campaign.parse_row({**ROWS[0],**changes},DEFAULTS)
+
+def test_plan_rows(tables):
+    records=xct_campaign.plan_rows([(str(i),row) for i,row in enumerate(ROWS)],DEFAULTS,tables)
+    assert [record['sample'] for record in records]==['0','1','2','3','4']
+    assert [bool(record['error']) for record in records]==[False,True,True,True,False]
+    assert 'diameter' in records[1]['error'] and 'maximum energy' in records[2]['error'] and 'Unobtainium' in records[3]['error']
+    for record in (records[0],records[4]):
+        assert record['voxelSize']>0 and record['minimumFeature']>=record['voxelSize']
+        assert math.isfinite(record['experimentTime']) and record['experimentTime']>0
+    assert records[0]['voxelSize']==21 and records[4]['scans']==3
+    assert records[1]['voxelSize']=='' and records[1]['experimentTime']==''
+
+def _run(workers, format='jsonl'):
+    output=io.StringIO()
+    chunks=[[(str(i),row) for i,row in enumerate(ROWS[:3])],[(str(i),row) for i,row in enumerate(ROWS[3:],start=3)]]
+    totals=xct_campaign.run(iter(chunks),xct_campaign.Writer(output,format),DEFAULTS,FIXTURE,workers)
+    return totals,output.getvalue()
+
+@pytest.mark.parametrize('workers',[1,2])
+def test_run(workers, tables):
+    (samples,errors,beamTime),text=_run(workers)
+    records=[json.loads(line) for line in text.splitlines()]              # strict json: no NaN or Infinity
+    assert [record['sample'] for record in records]==['0','1','2','3','4']
+    expected=xct_campaign.plan_rows([(str(i),row) for i,row in enumerate(ROWS)],DEFAULTS,tables)
+    assert (samples,errors)==(5,3)
+    assert beamTime==round(expected[0]['experimentTime']+expected[4]['experimentTime'],1) and math.isfinite(beamTime)
+    assert 'NaN' not in text and 'Infinity' not in text
+
+def test_csv_output():
+    _,text=_run(1,'csv')
+    lines=text.splitlines()
+    assert lines[0]==','.join(xct_campaign.FIELDS) and len(lines)==6
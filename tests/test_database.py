@@ -0,0 +1,83 @@
+#Snapshot cache of the attenuation database: versions on disk, background refresh of the store, fallback to the previous
+#snapshot when the upstream fails and offline mode.
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+import xct_database
+
+def _frame(value):
+    return pd.DataFrame({'Energy (kV)':[10.0,20.0,30.0],'Quartz':[value,value/2,value/4],'Cu':[100.0,50.0,25.0]})
+
+def _wait_for_refresh():
+    for thread in threading.enumerate():
+        if thread.name=='xct-database-refresh':
+            thread.join(10)
+
+@pytest.fixture
+def upstream(monkeypatch):
+    ########### stub of the google sheet: every fetch returns a new table (Quartz at 20 kV = number of the fetch), or raises
+    monkeypatch.setattr(xct_database,'RETRY_DELAY',0)
+    class Upstream:
+        fetches=0
+        fail=False
+        def __call__(self):
+            if self.fail:
+                raise ConnectionError('upstream down')
+            self.fetches+=1
+            return _frame(2.0*self.fetches)
+    return Upstream()
+
+def test_write_and_read(tmp_path):
+    index=xct_database.write_snapshot(_frame(8.0),tmp_path)
+    table,metadata=xct_database.read_snapshot(tmp_path)
+    assert metadata==index and metadata['version']==1
+    pd.testing.assert_frame_equal(table,_frame(8.0))
+
+def test_keeps_newest_versions(tmp_path):
+    for value in range(6):
+        xct_database.write_snapshot(_frame(float(value)),tmp_path)
+    assert sorted(path.name for path in tmp_path.glob('*.npy'))==[f'attenuation-v{v:06d}.npy' for v in (4,5,6)]
+    assert not list(tmp_path.glob('*.tmp'))
+    assert xct_database.read_index(tmp_path)['version']==6
+
+def test_background_refresh(tmp_path, upstream):
+    store=xct_database.AttenuationStore(upstream,tmp_path,ttl=0,offline=False)   # first start fetches synchronously
+    assert store.metadata['version']==1
+    table,metadata=store.snapshot()                      # older than ttl=0: refresh in the background, serves v1 meanwhile
+    assert metadata['version']==1 and table['Quartz'][1]==1.0
+    _wait_for_refresh()
+    table,metadata=store.snapshot()
+    _wait_for_refresh()
+    assert metadata['version']==2
+    assert table['Quartz'][1]==metadata['version']       # the table always comes with its own version
+
+def test_failed_refresh_keeps_snapshot(tmp_path, upstream):
+    store=xct_database.AttenuationStore(upstream,tmp_path,ttl=0,offline=False)
+    store.snapshot()
+    _wait_for_refresh()
+    upstream.fail=True
+    before=store.snapshot()                              # v2, the refresh to v3 fails
+    _wait_for_refresh()
+    assert before[1]['version']==2
+    assert store.snapshot() is before                    # the same (table, metadata), not a half-updated pair
+    _wait_for_refresh()
+    assert xct_database.read_index(tmp_path)['version']==before[1]['version']
+
+def test_restart_from_snapshot(tmp_path, upstream):
+    xct_database.write_snapshot(_frame(4.0),tmp_path)
+    store=xct_database.AttenuationStore(upstream,tmp_path,ttl=3600,offline=False)
+    table,metadata=store.snapshot()
+    assert upstream.fetches==0 and metadata['version']==1 and table['Quartz'][1]==2.0
+
+def test_offline_without_snapshot(tmp_path, upstream):
+    with pytest.raises(xct_database.SnapshotUnavailable):
+        xct_database.AttenuationStore(upstream,tmp_path,offline=True)
+    assert upstream.fetches==0
+
+def test_offline_never_refreshes(tmp_path, upstream):
+    xct_database.write_snapshot(_frame(4.0),tmp_path)
+    store=xct_database.AttenuationStore(upstream,tmp_path,ttl=0,offline=True)
+    store.snapshot()
+    _wait_for_refresh()
+    assert upstream.fetches==0 and store.metadata['version']==1
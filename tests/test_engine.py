@@ -0,0 +1,77 @@
+#Parity of xct_engine with the if-chains of the original app (xct_explorer_270824.py before the engine): voxel size, data
+#size, scan time, experiment time and the red (long scan) thresholds for every binning and detector width.
+import itertools
+import numpy as np
+import pytest
+import xct_engine
+
+def legacy_geometry(radio3, radio4, diameter):
+    if radio3=='1x' and radio4=='1920':
+        return int(0.5627*diameter-0.5293),11
+    if radio3=='1x' and radio4=='2856':
+        return int(0.3626*diameter+0.0151),32
+    if radio3=='2x' and radio4=='1920':
+        return int(1.1254*diameter -1.0585),1.4
+    if radio3=='2x' and radio4=='2856':
+        return int(0.7236*diameter+0.4404),4.3
+    if radio3=='3x' and radio4=='1920':
+        return int(1.6881*diameter-1.5878),0.4
+    if radio3=='3x' and radio4=='2856':
+        return int(1.1254*diameter-1.0585),1.2
+
+def legacy_time(radio3, radio4, voxelSize, filterThickness, maximumEnergy, inNumbScans=1):
+    if voxelSize<15:
+        power = 15
+    else:
+        power = voxelSize
+    if radio3=='1x' and radio4=='1920':
+        cameraFactor=1
+        scanTime=round((1.38*filterThickness-0.0198*maximumEnergy-0.0328*power+6.048)*cameraFactor,1)
+    if radio3=='2x' and radio4=='1920':
+        cameraFactor=1
+        scanTime=round((0.68*filterThickness-0.0109*maximumEnergy-0.0152*power+2.607)*cameraFactor,1)
+    if radio3=='3x' and radio4=='1920':
+        cameraFactor=1
+        scanTime=round((0.328*filterThickness-0.0055*maximumEnergy-0.0068*power+1.19)*cameraFactor,1)
+    if radio3=='1x' and radio4=='2856':
+        cameraFactor=1.4875
+        scanTime=round((1.38*filterThickness-0.0198*maximumEnergy-0.0328*power+6.048)*cameraFactor,1)
+    if radio3=='2x' and radio4=='2856':
+        cameraFactor=1.4875
+        scanTime=round((0.68*filterThickness-0.0109*maximumEnergy-0.0152*power+2.607)*cameraFactor,1)
+    if radio3=='3x' and radio4=='2856':
+        cameraFactor=1.4875
+        scanTime=round((0.328*filterThickness-0.0055*maximumEnergy-0.0068*power+1.19)*cameraFactor,1)
+    if scanTime<0.1:
+        scanTime=0.1
+    experimentTime=round((scanTime+0.2)*inNumbScans,1)
+    longScan=((radio3=='1x' and radio4=='2856' and scanTime>6.2) or (radio3=='2x' and radio4=='2856' and scanTime>3.2) or
+              (radio3=='3x' and radio4=='2856' and scanTime>2.2) or (radio3=='1x' and radio4=='1920' and scanTime>4.2) or
+              (radio3=='2x' and radio4=='1920' and scanTime>2.2) or (radio3=='3x' and radio4=='1920' and scanTime>1.5))
+    return scanTime,experimentTime,longScan
+
+SETTINGS=list(itertools.product((1,2,3),(1920,2856)))
+DIAMETERS=np.arange(1,151,1)
+THICKNESSES=np.round(np.arange(0,2.55,0.1),2)
+ENERGIES=np.arange(0,185,5)
+
+@pytest.mark.parametrize('binning,detector',SETTINGS)
+def test_geometry(binning, detector):
+    expected=[legacy_geometry(f'{binning}x',str(detector),int(diameter)) for diameter in DIAMETERS]
+    assert xct_engine.voxel_size(DIAMETERS,binning,detector).tolist()==[voxelSize for voxelSize,_ in expected]
+    assert float(xct_engine.data_size(binning,detector))==expected[0][1]
+
+@pytest.mark.parametrize('binning,detector',SETTINGS)
+def test_time(binning, detector):
+    diameter,thickness,energy=(a.ravel() for a in np.meshgrid(DIAMETERS[::3],THICKNESSES,ENERGIES,indexing='ij'))
+    voxelSize=xct_engine.voxel_size(diameter,binning,detector)
+    expected=np.array([legacy_time(f'{binning}x',str(detector),int(v),float(t),int(e),3) for v,t,e in zip(voxelSize,thickness,energy)])
+    scanTime=xct_engine.scan_time(binning,detector,thickness,energy,voxelSize)
+    assert scanTime.tolist()==expected[:,0].tolist()
+    assert xct_engine.experiment_time(scanTime,3).tolist()==expected[:,1].tolist()
+    assert xct_engine.long_scan(binning,detector,scanTime).tolist()==expected[:,2].astype(bool).tolist()
+
+def test_reported_rounding():
+    ########### 6.55 h rounds to 6.5 with round() but to 6.6 with np.round
+    voxelSize=xct_engine.voxel_size(37,1,1920)
+    assert float(xct_engine.scan_time(1,1920,1.7,60,voxelSize))==legacy_time('1x','1920',int(voxelSize),1.7,60)[0]==6.5
@@ -0,0 +1,50 @@
+#Runs of the instrumentation: reruns of the script that are aborted before their end are still counted, as aborted, and
+#the fragments rerun after them are runs of their own.
+import contextvars
+import pytest
+import xct_metrics
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(xct_metrics,'ENABLED',True)
+    monkeypatch.setattr(xct_metrics,'REGISTRY',xct_metrics.Registry())
+    return xct_metrics.REGISTRY
+
+def _isolated(test):
+    ########### the current run is a context variable: every test in a context of its own, as every session of the app
+    return lambda *args,**kwargs:contextvars.copy_context().run(test,*args,**kwargs)
+
+@_isolated
+def _complete_rerun():
+    xct_metrics.start_run()
+    with xct_metrics.stage('database'):
+        pass
+    with xct_metrics.run('planner'):                     # fragment inside of the rerun: a stage of it
+        pass
+    return xct_metrics.finish_run()
+
+def test_complete_rerun(registry):
+    record=_complete_rerun()
+    assert record['result']=='ok' and set(record['stages'])=={'database','planner'}
+    assert registry.counters=={('reruns_total',(('result','ok'),('run','script'))):1}
+
+@_isolated
+def _aborted_reruns():
+    xct_metrics.start_run()
+    with xct_metrics.stage('database'):
+        pass                                             # st.stop() or a new rerun: finish_run is never reached
+    with xct_metrics.run('maximumEnergy',rerun=True) as fragment:
+        pass
+    assert fragment.name=='maximumEnergy' and xct_metrics.current() is None
+    xct_metrics.start_run()
+    xct_metrics.start_run()                              # the previous rerun was aborted before the end of the script
+    return xct_metrics.finish_run()
+
+def test_aborted_reruns(registry):
+    record=_aborted_reruns()
+    assert record['result']=='ok' and record['stages']=={}
+    assert registry.counters=={('reruns_total',(('result','aborted'),('run','script'))):2,
+                               ('reruns_total',(('result','ok'),('run','maximumEnergy'))):1,
+                               ('reruns_total',(('result','ok'),('run','script'))):1}
+    assert 'xct_rerun_duration_seconds_count{result="aborted",run="script"} 2' in registry.prometheus_text()
+    assert 'xct_stage_duration_seconds_count{stage="database"} 1' in registry.prometheus_text()
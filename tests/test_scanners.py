@@ -0,0 +1,78 @@
+#Scanner profiles: fit of the voxel size of the profiles without explicit coefficients, the table of several scanners and
+#its cache on disk.
+import json
+import os
+import shutil
+import numpy as np
+import pytest
+import xct_engine
+import xct_scanners
+
+ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OTHER={'name':'Other','binnings':[1,2,4],'detectors':[1000,1920],'defaults':{'binning':2,'detector':1000},
+       'calibration':{'binning':1,'detector':1000,'diameters':[12,40,150],'voxelSizes':[6,22,83],'detectorFactors':{'1000':1.5,'1920':1}},
+       'dataSize':[[1,2],[3,4],[5,6]],'longScanTime':[[1,2],[3,4],[5,6]],
+       'time':{'coefficients':[[1.38,-0.0198,-0.0328,6.048],[0.68,-0.0109,-0.0152,2.607],[0.328,-0.0055,-0.0068,1.19]],
+               'cameraFactor':[1.2,1],'minimumPower':15,'minimumScanTime':0.1,'warmupTime':0.2}}
+
+@pytest.fixture
+def profiles(tmp_path):
+    ########### the CoreTom profile of the app and a scanner fitted from its calibration points
+    folder=tmp_path/'profiles'
+    folder.mkdir()
+    shutil.copy(os.path.join(ROOT,'scanners','coretom.json'),folder)
+    (folder/'other.json').write_text(json.dumps(OTHER))
+    return str(folder)
+
+@pytest.fixture
+def table(profiles, tmp_path, monkeypatch):
+    table=xct_scanners.load(profiles,str(tmp_path/'cache'))
+    monkeypatch.setattr(xct_engine,'SCANNERS',table)
+    return table
+
+def test_table(table):
+    assert table.names==('CoreTom','Other')
+    assert table.binnings==(1,2,3,4) and table.detectors==(1000,1920,2856)
+    assert table.options('Other')==((1,2,4),(1000,1920))
+    assert np.isnan(table.voxelSlope[0,3]).all() and np.isnan(table.voxelSlope[1,2]).all()   # CoreTom 4x, Other 3x
+
+def test_fitted_voxel_size(table):
+    diameters=np.array([12,40,150])
+    for binning in (1,2,4):
+        for detector,factor in ((1000,1.5),(1920,1)):
+            slope,intercept=np.polyfit(diameters,np.array([6,22,83])*binning*factor,1)
+            s,b,d=table.index('Other',binning,detector)
+            assert table.voxelSlope[s,b,d]==pytest.approx(slope) and table.voxelIntercept[s,b,d]==pytest.approx(intercept)
+            assert xct_engine.voxel_size(100,binning,detector,'Other')==int(slope*100+intercept)
+    ########### explicit coefficients of the CoreTom profile, side by side with the fitted scanner in one call
+    assert xct_engine.voxel_size(100,2,1920,['CoreTom','Other']).tolist()==[int(1.1254*100-1.0585),int(np.polyfit(diameters,[12,44,166],1)@[100,1])]
+
+def test_not_available(table):
+    with pytest.raises(ValueError,match=r'^Not available: CoreTom binning 4 detector 1000, Other binning 3 detector 1000$'):
+        xct_engine.voxel_size(20,[[4],[3]],1000,[['CoreTom'],['Other']])
+    with pytest.raises(ValueError,match='^Not available: Other binning 1 detector 2856$'):
+        table.index('Other',1,2856)
+    with pytest.raises(ValueError,match='Unknown scanner'):
+        table.index('Micro',1,1920)
+
+def test_cache(profiles, tmp_path):
+    cacheDir=str(tmp_path/'cache')
+    fitted=xct_scanners.load(profiles,cacheDir)
+    cache=xct_scanners._cache_path(xct_scanners.read_profiles(profiles),cacheDir)
+    assert os.listdir(cacheDir)==[os.path.basename(cache)]
+    cached=xct_scanners.load(profiles,cacheDir)
+    for name in xct_scanners.ARRAYS:
+        np.testing.assert_array_equal(getattr(cached,name),getattr(fitted,name))
+
+def test_corrupt_cache(profiles, tmp_path):
+    ########### a truncated or garbage cache (e.g. a crash while it was written) is fitted again and overwritten
+    cacheDir=tmp_path/'cache'
+    cacheDir.mkdir()
+    cache=xct_scanners._cache_path(xct_scanners.read_profiles(profiles),str(cacheDir))
+    with open(cache,'wb') as file:
+        file.write(b'not a zip file')
+    table=xct_scanners.load(profiles,str(cacheDir))
+    assert table.names==('CoreTom','Other')
+    with np.load(cache) as arrays:
+        np.testing.assert_array_equal(arrays['voxelSlope'],table.voxelSlope)
+    assert os.listdir(cacheDir)==[os.path.basename(cache)]                  # no temporary file left
@@ -0,0 +1,71 @@
+#Interpolation of the energy at 10%/1% transmission and of the filter coefficients (replaces the curve fit of the original
+#app), the memoized solver of the app and the comparison with the legacy curve fit.
+import warnings
+import numpy as np
+import pytest
+import xct_engine
+
+ENERGY=np.arange(10,410,10,dtype=float)
+
+def test_monotone_curve():
+    ########### log-transmission linear in the energy: the crossings are exact
+    transmission=100*np.exp(np.log(0.01)*(400-ENERGY)/390)                # 1% at 10 kV, 100% at 400 kV
+    expected10=400-390*np.log(0.1)/np.log(0.01)
+    assert xct_engine.transmission_energy(ENERGY,transmission,10)==pytest.approx(expected10)
+    assert xct_engine.transmission_energy(ENERGY,transmission,1)==pytest.approx(10)
+    assert xct_engine.transmission_energy(ENERGY,transmission,50)==pytest.approx(400-390*np.log(0.5)/np.log(0.01))
+
+def test_absorption_edge():
+    ########### the transmission drops from 20% to 5% at 60 kV (edge): 25% is reached between 60 and 70 kV, interpolated from
+    ########### the running maximum (20%) and not from the 5% after the edge
+    transmission=np.interp(ENERGY,[10,50,60,70,400],[1,20,5,30,90])
+    assert xct_engine.transmission_energy(ENERGY,transmission,25)==pytest.approx(60+10*np.log(25/20)/np.log(30/20))
+    assert xct_engine.transmission_energy(ENERGY,transmission,10)==pytest.approx(20+10*np.log(10/5.75)/np.log(10.5/5.75))
+    curves=np.stack([transmission,np.maximum.accumulate(transmission)])
+    result=xct_engine.transmission_energy(ENERGY,curves,[25,25])
+    assert result[0]==result[1]
+
+def test_never_reaches_target():
+    ########### too absorbing: clamped to the last energy of the database
+    transmission=np.full(len(ENERGY),0.5)
+    transmission[-1]=5
+    assert xct_engine.transmission_energy(ENERGY,transmission,10)==ENERGY[-1]
+    assert xct_engine.transmission_energy(ENERGY,np.zeros(len(ENERGY)),1)==ENERGY[-1]
+
+def test_full_transmission():
+    ########### no sample: transmits at the first energy, and the filter coefficient is the one of the first energy
+    transmission=np.full(len(ENERGY),100.0)
+    assert xct_engine.transmission_energy(ENERGY,transmission,10)==ENERGY[0]
+    attFilter=np.linspace(500,1,len(ENERGY))
+    energy10,energy1,att10,att1=xct_engine.filter_attenuation(ENERGY,transmission,attFilter)
+    assert (energy10,energy1)==(ENERGY[0],ENERGY[0])
+    assert att10==pytest.approx(attFilter[0]) and att1==pytest.approx(attFilter[0])
+
+def test_filter_coefficient_log_log():
+    attFilter=1000*ENERGY**-2.0
+    assert xct_engine.filter_coefficient(ENERGY,attFilter,25)==pytest.approx(1000*25**-2.0)
+
+def test_filter_solver_equivalent_mixtures(phase_table):
+    solve=xct_engine.filter_solver(phase_table)
+    first=solve(('Quartz','Calcite'),(0.6,0.3),20)
+    hits=solve.cache_info().hits
+    assert solve(('Calcite','Quartz','Quartz','Air'),(0.3,0.3,0.3,0.0),20.0)==first       # repeated phases, zero fraction
+    assert solve.cache_info().hits==hits+1
+    direct=xct_engine.filter_attenuation(phase_table.energy,phase_table.transmission(['Quartz','Calcite'],[0.6,0.3],20),
+                                         phase_table[xct_engine.FILTER_PHASE])
+    assert first==pytest.approx(tuple(float(v) for v in direct))
+
+def _deviation(phase_table, phases, fractions, diameter):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')                                    # OptimizeWarning of curve_fit
+        return xct_engine.fit_deviation(phase_table.energy,phase_table.transmission(phases,fractions,diameter),
+                                        phase_table[xct_engine.FILTER_PHASE])
+
+def test_fit_deviation(phase_table):
+    deviation=_deviation(phase_table,('Quartz','Calcite'),(0.6,0.3),20)
+    assert all(np.isfinite(value['difference']) for value in deviation.values())
+
+def test_fit_deviation_not_converged(phase_table):
+    deviation=_deviation(phase_table,('Calcite','Quartz'),(0.5,0.3),80)
+    assert all(np.isnan(value['fitted']) for value in deviation.values())
+    assert all(np.isfinite(value['interpolated']) for value in deviation.values())
@@ -0,0 +1,67 @@
+#Polychromatic spectrum: the precomputed tensor of the tube spectra filtered by the grid of filter thicknesses against the
+#direct contraction of the spectrum with the filter and sample transmissions.
+import numpy as np
+import pytest
+import xct_engine
+
+PHASES=['Hematite','Barite']
+FRACTIONS=[0.3,0.2]
+DIAMETER=100
+
+@pytest.fixture(scope='module')
+def spectrum_table(phase_table):
+    return xct_engine.SpectrumTable.from_phase_table(phase_table)
+
+@pytest.fixture(scope='module')
+def sample(phase_table):
+    ########### dense sample at 100 mm: the Fast option recommends a filter thicker than the 2.5 mm of the Ideal one
+    rows=phase_table.rows(PHASES)
+    totalTransm=xct_engine.sample_transmission(phase_table.attenuation[rows],FRACTIONS,DIAMETER)
+    result=xct_engine.plan(DIAMETER,2,1920,'Qualitative',FRACTIONS,phase_table.attenuation[rows],phase_table.energy,
+                           phase_table[xct_engine.FILTER_PHASE],'Fast',160)
+    return totalTransm,float(result['filterThickness'])
+
+def direct(phase_table, totalTransm, maximumEnergy, filterThickness):
+    ########### spectrum of the tube through the filter and the sample, normalized by the spectrum through the filter
+    spectrum=xct_engine.tube_spectrum(phase_table.energy,maximumEnergy)
+    filtered=spectrum*xct_engine.filter_transmission(phase_table[xct_engine.FILTER_PHASE],filterThickness)
+    return (filtered*totalTransm).sum()/filtered.sum()
+
+def test_grid(spectrum_table, phase_table):
+    thicknesses=spectrum_table.thicknesses
+    assert thicknesses[0]==0 and np.allclose(np.diff(thicknesses),xct_engine.FILTER_THICKNESS_STEP)
+    assert thicknesses[-1]>xct_engine.MAXIMUM_FILTER_THICKNESS
+    assert thicknesses[-1]>=float(xct_engine.filter_thickness('Fast',np.inf,np.min(phase_table[xct_engine.FILTER_PHASE]))[0])
+
+def test_lookup_thick_filter(spectrum_table, phase_table, sample):
+    totalTransm,filterThickness=sample
+    assert filterThickness>xct_engine.MAXIMUM_FILTER_THICKNESS
+    effective=spectrum_table.lookup(spectrum_table.evaluate(totalTransm)['effectiveTransmission'],160,filterThickness)
+    assert np.isfinite(effective)
+    assert effective==pytest.approx(direct(phase_table,totalTransm,160,filterThickness),rel=1e-3)
+    exact=xct_engine.SpectrumTable(phase_table.energy,phase_table[xct_engine.FILTER_PHASE],[160],[filterThickness])
+    assert effective==pytest.approx(exact.evaluate(totalTransm)['effectiveTransmission'][0,0],rel=1e-3)
+
+def test_lookup_on_the_grid(spectrum_table, phase_table, sample):
+    totalTransm,_=sample
+    values=spectrum_table.evaluate(totalTransm)['effectiveTransmission']
+    for maximumEnergy,filterThickness in ((60,0),(100,0.5),(180,2.5)):
+        assert spectrum_table.lookup(values,maximumEnergy,filterThickness)==pytest.approx(direct(phase_table,totalTransm,maximumEnergy,filterThickness))
+
+def test_lookup_outside_of_the_grid(spectrum_table, sample):
+    totalTransm,_=sample
+    values=spectrum_table.evaluate(totalTransm)['effectiveTransmission']
+    looked=spectrum_table.lookup(values,160,[-0.1,0,spectrum_table.thicknesses[-1],spectrum_table.thicknesses[-1]+0.1])
+    assert np.isnan(looked[[0,3]]).all() and np.isfinite(looked[[1,2]]).all()
+
+def test_no_spectrum(spectrum_table, phase_table, sample):
+    ########### Emax 0: the tube emits nothing, there is no effective transmission nor mean energy (nor up to the first energy
+    ########### of the database)
+    totalTransm,_=sample
+    result=spectrum_table.evaluate(totalTransm)
+    for name in ('effectiveTransmission','meanEnergy','beamHardening'):
+        assert np.isnan(result[name][0]).all()
+    assert np.isnan(spectrum_table.lookup(result['effectiveTransmission'],0,1.0))
+    emits=spectrum_table.maximumEnergies>phase_table.energy[0]
+    assert np.isnan(result['effectiveTransmission'][~emits]).all()
+    assert np.isfinite(result['effectiveTransmission'][spectrum_table.maximumEnergies==160]).all()
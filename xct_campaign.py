@@ -0,0 +1,224 @@
+#Batch planning of a campaign: every row of a CSV of samples is planned with the same equations as the app (xct_engine.py)
+#and the results are streamed to a CSV or JSONL file, so campaigns of any size run in constant memory. The rows are planned
+#in chunks spread over a pool of processes, the total beam time of the campaign is printed at the end.
+#
+#   python xct_campaign.py samples.csv -o plan.csv
+#   python xct_campaign.py samples.csv -o plan.jsonl --database attenuation.csv --workers 8
+#
+#Columns of the input (header required, any order, case insensitive):
+#   sample          name of the sample (optional, the row number otherwise)
+#   diameter        mm
+#   phases          phases of the database separated by ';' e.g. Quartz;Calcite
+#   fractions       volume fractions (0-1) of the phases in the same order e.g. 0.6;0.3
+#   purpose         Qualitative, Quantify or Classify
+#   scanner, binning, detector, filter, maximum_energy, scans    optional, the command line defaults otherwise
+import argparse
+import collections
+import concurrent.futures
+import contextlib
+import csv
+import json
+import math
+import os
+import re
+import sys
+import numpy as np
+import pandas as pd
+import xct_engine
+import xct_database
+import xct_contrast
+
+FIELDS=('sample','scanner','diameter','purpose','binning','detector','filter','maximumEnergy','scans','phases','fractions',
+        'voxelSize','minimumFeature','DataSize','filterThickness','energyAt10percTransm','scanTime','experimentTime','minimumContrast','warnings','error')
+SEPARATOR=re.compile(r'[;|]')
+CHUNK_SIZE=64                                     # rows planned in one vectorized call
+
+_tables=None                                      # (PhaseTable, ContrastTable) of the worker process
+
+def load_phase_table(database=None):
+    ########### from a CSV with the layout of the app database, or from the snapshot of the app (see xct_database.py)
+    if database:
+        return xct_engine.PhaseTable.from_frame(pd.read_csv(database))
+    return xct_engine.PhaseTable.from_frame(xct_database.read_snapshot()[0])
+
+def load_tables(database=None):
+    phaseTable=load_phase_table(database)
+    return phaseTable,xct_contrast.ContrastTable(phaseTable)
+
+def _initialize(database):
+    global _tables
+    _tables=load_tables(database)
+
+def _split(value):
+    return [item.strip() for item in SEPARATOR.split(value or '') if item.strip()]
+
+def parse_row(row, defaults):
+    ########### one sample of the input, columns missing or empty take the defaults. Raises ValueError if invalid
+    def value(name):
+        text=(row.get(name) or '').strip()
+        if text:
+            return text
+        if name in defaults:
+            return defaults[name]
+        raise ValueError(f'missing {name}')
+    phases=_split(value('phases'))
+    fractions=[float(fraction) for fraction in _split(value('fractions'))]
+    if len(phases)!=len(fractions):
+        raise ValueError(f'{len(phases)} phases but {len(fractions)} fractions')
+    if not all(math.isfinite(fraction) and fraction>=0 for fraction in fractions):
+        raise ValueError('the volume fractions must be finite and not negative')
+    sample={'scanner':value('scanner'),'diameter':float(value('diameter')),'purpose':value('purpose'),'binning':int(str(value('binning')).rstrip('xX')),
+            'detector':int(value('detector')),'filter':value('filter'),'maximumEnergy':float(value('maximum_energy')),
+            'scans':int(value('scans')),'phases':phases,'fractions':fractions}
+    ########### float() accepts nan and inf, which would go through the engine as a voxel size of -2**63 and a nan beam time
+    if not math.isfinite(sample['diameter']) or sample['diameter']<=0:
+        raise ValueError('the diameter must be a positive number')
+    if not math.isfinite(sample['maximumEnergy']):
+        raise ValueError('the maximum energy must be a number')
+    if sample['scans']<1:
+        raise ValueError('the number of scans must be at least 1')
+    if sample['scanner'] not in xct_engine.SCANNERS.names:
+        raise ValueError(f"unknown scanner {sample['scanner']!r}, expected one of {list(xct_engine.SCANNERS.names)}")
+    binnings,detectors=xct_engine.SCANNERS.options(sample['scanner'])
+    for name,options in (('purpose',xct_engine.PURPOSES),('binning',binnings),('detector',detectors),('filter',xct_engine.FILTER_MODES)):
+        if sample[name] not in options:
+            raise ValueError(f'unknown {name} {sample[name]!r}, expected one of {list(options)}')
+    return sample
+
+def plan_rows(rows, defaults, tables=None):
+    ########### [(sample name, row)] -> output records, all the valid rows of the chunk are planned in one call of the engine
+    phaseTable,contrastTable=tables or _tables
+    records=[]
+    valid=[]
+    for name,row in rows:
+        record=dict.fromkeys(FIELDS,'')
+        record['sample']=name
+        try:
+            sample=parse_row(row,defaults)
+            weights=phaseTable.weights(sample['phases'],sample['fractions'])
+        except KeyError as error:
+            record['error']=error.args[0]
+        except ValueError as error:
+            record['error']=str(error)
+        else:
+            record.update(sample,phases=';'.join(sample['phases']),fractions=';'.join(f'{f:g}' for f in sample['fractions']))
+            valid.append((record,sample,weights))
+        records.append(record)
+    if not valid:
+        return records
+    column=lambda key: np.array([sample[key] for _,sample,_ in valid])
+    weights=np.stack([weights for _,_,weights in valid])
+    result=xct_engine.plan(column('diameter'),column('binning'),column('detector'),column('purpose'),
+                           weights,phaseTable.attenuation,phaseTable.energy,
+                           phaseTable[xct_engine.FILTER_PHASE],column('filter'),column('maximumEnergy'),column('scans'),column('scanner'))
+    ########### contrast between the phases of each sample over the energies it transmits, up to the maximum energy
+    contrast=contrastTable.worst_contrast(weights>0,result['energyAt10percTransm'],column('maximumEnergy'))
+    for i,(record,sample,_) in enumerate(valid):
+        warnings=[]
+        if sum(sample['fractions'])>1:
+            warnings.append('volume fractions add up to more than 1')
+        if sample['filter']=='No Filter':
+            warnings.append('potential artifacts, no filter')
+        if result['lowTransmission'][i]:
+            warnings.append('low transmission')
+        if result['lowCounts'][i]:
+            warnings.append('limited counts, reduce sample diameter')
+        if result['longScan'][i]:
+            warnings.append('long scan')
+        if contrast[i]<xct_contrast.CONTRAST_THRESHOLD:            # nan if the sample does not transmit below the maximum energy
+            warnings.append('phases hard to distinguish')
+        record.update(voxelSize=int(result['voxelSize'][i]),minimumFeature=int(result['minimumFeature'][i]),
+                      DataSize=float(result['DataSize'][i]),filterThickness=round(float(result['filterThickness'][i]),2),
+                      energyAt10percTransm=round(float(result['energyAt10percTransm'][i]),1),
+                      scanTime=float(result['scanTime'][i]),experimentTime=float(result['experimentTime'][i]),
+                      minimumContrast=round(float(contrast[i]),3) if np.isfinite(contrast[i]) else '',
+                      warnings='; '.join(warnings))
+    return records
+
+def read_chunks(file, chunkSize=CHUNK_SIZE):
+    ########### [(sample name, row)] in chunks, the column names are normalized (lower case, '_' for spaces)
+    reader=csv.DictReader(file)
+    reader.fieldnames=[re.sub(r'\s+','_',name.strip().lower()) for name in reader.fieldnames or []]
+    chunk=[]
+    for number,row in enumerate(reader,start=1):
+        chunk.append(((row.get('sample') or '').strip() or str(number),row))
+        if len(chunk)==chunkSize:
+            yield chunk
+            chunk=[]
+    if chunk:
+        yield chunk
+
+class Writer:
+    def __init__(self, file, format):
+        self.file=file
+        self.format=format
+        if format=='csv':
+            self.writer=csv.DictWriter(file,FIELDS,lineterminator='\n')
+            self.writer.writeheader()
+
+    def write(self, records):
+        for record in records:
+            if self.format=='csv':
+                self.writer.writerow(record)
+            else:
+                self.file.write(json.dumps({key:value for key,value in record.items() if value!=''})+'\n')
+        self.file.flush()
+
+def run(chunks, writer, defaults, database=None, workers=1):
+    ########### plans the chunks in order and writes them as they are done, at most 2 chunks per worker are in flight.
+    ########### Returns the number of samples, the number of rows with errors and the total experiment time (hrs)
+    totals=collections.Counter()
+    def collect(records):
+        writer.write(records)
+        for record in records:
+            totals['samples']+=1
+            if record['error']:
+                totals['errors']+=1
+            else:
+                totals['experimentTime']+=record['experimentTime']
+    if workers==1:
+        tables=load_tables(database)
+        for chunk in chunks:
+            collect(plan_rows(chunk,defaults,tables))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers,initializer=_initialize,initargs=(database,)) as executor:
+            pending=collections.deque()
+            for chunk in chunks:
+                pending.append(executor.submit(plan_rows,chunk,defaults))
+                if len(pending)>=2*workers:
+                    collect(pending.popleft().result())
+            while pending:
+                collect(pending.popleft().result())
+    return totals['samples'],totals['errors'],round(totals['experimentTime'],1)
+
+def main(argv=None):
+    parser=argparse.ArgumentParser(description='Plans a campaign of XCT scans from a CSV of samples')
+    parser.add_argument('samples',help="CSV of samples, '-' for stdin")
+    parser.add_argument('-o','--output',default='-',help="CSV or JSONL file of results, '-' for stdout (default)")
+    parser.add_argument('--format',choices=('csv','jsonl'),help='format of the output (default from the extension, csv for stdout)')
+    parser.add_argument('--database',help='CSV of attenuation coefficients (default: the snapshot of the app, see XCT_SNAPSHOT_DIR)')
+    parser.add_argument('--workers',type=int,default=os.cpu_count(),help='processes (default: number of CPUs)')
+    parser.add_argument('--chunk-size',type=int,default=CHUNK_SIZE,help=f'rows planned at once (default {CHUNK_SIZE})')
+    parser.add_argument('--scanner',default=xct_engine.DEFAULT_SCANNER,choices=xct_engine.SCANNERS.names,
+                        help=f'profile of the scanner when not in the input (default {xct_engine.DEFAULT_SCANNER}, see XCT_SCANNERS)')
+    parser.add_argument('--binning',default='2',help='when not in the input (default 2)')
+    parser.add_argument('--detector',default='1920',help='when not in the input (default 1920)')
+    parser.add_argument('--filter',default='Ideal',choices=xct_engine.FILTER_MODES,help='when not in the input (default Ideal)')
+    parser.add_argument('--maximum-energy',default='160',help='kV, when not in the input (default 160)')
+    parser.add_argument('--scans',default='1',help='number of scans per sample, when not in the input (default 1)')
+    args=parser.parse_args(argv)
+    defaults={'scanner':args.scanner,'binning':args.binning,'detector':args.detector,'filter':args.filter,'maximum_energy':args.maximum_energy,'scans':args.scans}
+    format=args.format or ('jsonl' if args.output.endswith(('.jsonl','.json')) else 'csv')
+    try:
+        load_phase_table(args.database)                # fail early, before the output is created
+    except (OSError,ValueError,xct_database.SnapshotUnavailable) as error:
+        parser.error(f'cannot read the database of attenuation coefficients: {error}')
+    samples=contextlib.nullcontext(sys.stdin) if args.samples=='-' else open(args.samples,newline='')
+    output=contextlib.nullcontext(sys.stdout) if args.output=='-' else open(args.output,'w',newline='')
+    with samples as samples, output as output:
+        number,errors,beamTime=run(read_chunks(samples,args.chunk_size),Writer(output,format),defaults,args.database,max(args.workers,1))
+    print(f'{number} samples planned ({errors} with errors). Total beam time: {beamTime} hrs ({beamTime/24:.1f} days)',file=sys.stderr)
+    return 1 if errors else 0
+
+if __name__=='__main__':
+    sys.exit(main())
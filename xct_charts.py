@@ -0,0 +1,87 @@
+#Altair charts of the app. They only depend on pandas/altair (no streamlit), so they can be built and timed headless.
+#The data of every chart is a single long-form frame reduced to what is plotted (selected phases, energies of the x axis),
+#so the Vega-Lite spec sent to the browser stays small.
+import functools
+import altair as alt
+import numpy as np
+import pandas as pd
+import xct_engine
+import xct_scanners
+
+ENERGY_WINDOW=(10,int(xct_engine.MAXIMUM_ENERGIES.max()))      # x axis of the energy plots (kV), up to the highest Emax
+
+def phase_colors(n):
+    ########### colors of the phases in the plots, repeated if there are more phases than colors
+    colors=['lightblue','green','orange','red','#9467bd','#8c564b','#e377c2','#7f7f7f','#bcbd22','#17becf']
+    return [colors[i%len(colors)] for i in range(n)]
+
+def energy_window(energy, window=ENERGY_WINDOW):
+    ########### mask of the energies needed to draw the window, including the first energy past each end
+    energy=np.asarray(energy,dtype=float)
+    first=max(np.searchsorted(energy,window[0],side='right')-1,0)
+    last=np.searchsorted(energy,window[1],side='left')+1
+    mask=np.zeros(len(energy),dtype=bool)
+    mask[first:last]=True
+    return mask
+
+########################################## Geometric tab #################################################
+SETTING_COLORS=['#17becf','#1f77b4','#ff7f0e','#ffbb78','#2ca02c','#98df8a','#d62728','#ff9896','#9467bd','#c5b0d5']
+
+def geometry_settings(scanner=xct_engine.DEFAULT_SCANNER):
+    ########### calibration voxel sizes of every 'detector px, bin binning' of the scanner, from the finest voxel size
+    profile=xct_engine.SCANNERS.profiles[scanner]
+    points=xct_scanners.calibration_points(profile)
+    return {f'{detector} px, bin {binning}':points[binning,detector]
+            for binning in sorted(profile['binnings']) for detector in sorted(profile['detectors'],reverse=True)}
+
+def geometry_data(scanner=xct_engine.DEFAULT_SCANNER):
+    ########### end points of the regression lines Diameter vs Voxel Size of every setting. For the CoreTom VS_2856Bin3 is
+    ########### the same as VS_1920Bin2, so only 5 lines are actually visible in the plot
+    diameters=np.asarray(xct_engine.SCANNERS.profiles[scanner]['calibration']['diameters'],dtype=float)
+    lines=[]
+    for setting,voxelSizes in geometry_settings(scanner).items():
+        slope,intercept=np.polyfit(voxelSizes,diameters,1)
+        ends=np.array([voxelSizes.min(),voxelSizes.max()])
+        lines.append(pd.DataFrame({'Setting':setting,'VS':ends,'Diameter':slope*ends+intercept}))
+    return pd.concat(lines,ignore_index=True)
+
+@functools.lru_cache(maxsize=None)
+def geometry_lines(scanner=xct_engine.DEFAULT_SCANNER):
+    ########### the lines only depend on the scanner, the chart is built once per scanner and process
+    settings=list(geometry_settings(scanner))
+    return alt.Chart(geometry_data(scanner),height=400,width=600).mark_line(opacity=0.8).encode(
+        x=alt.X('VS:Q',title='Voxel Size (µm)'),y=alt.Y('Diameter:Q',title='Diameter (mm)'),
+        color=alt.Color('Setting:N',sort=settings).scale(domain=settings,range=[SETTING_COLORS[i%len(SETTING_COLORS)] for i in range(len(settings))]).legend(None),
+        tooltip=['Setting:N'])
+
+def geometry_chart(voxelSize, diameter, scanner=xct_engine.DEFAULT_SCANNER):
+    markPoint=pd.DataFrame({'VS':[voxelSize],'Diam':[diameter]})   # Red Dot in the plot, coordinates along respective line
+    plotMark = alt.Chart(markPoint,height=400,width=600).mark_point(color='red',size=120,fill='red').encode(x=alt.X('VS:Q',title='Voxel Size (µm)'),y=alt.Y('Diam:Q',title='Diameter (mm)'))
+    return geometry_lines(scanner)+plotMark
+
+########################################## Composition tab #################################################
+def attenuation_data(database, phases, energyColumn=xct_engine.ENERGY_COLUMN):
+    ########### long-form (Energy, Phase, Attenuation) of the selected phases in the energy window
+    window=database[energy_window(database[energyColumn])]
+    return window.melt(id_vars=[energyColumn],value_vars=list(phases),var_name='Phase',value_name='Attenuation')
+
+def attenuation_chart(data, phases):
+    ############## Plot Attenuation in the Composition Tab ###############################
+    return alt.Chart(data,width='container',height=400
+                    ).mark_line(clip=True).encode(x=alt.X('Energy (kV):Q').scale(domain=ENERGY_WINDOW),
+                                         y=alt.Y('Attenuation:Q',title='Attenuation Coefficient (cm-1)').scale(type="log"),
+                                         color=alt.Color('Phase:N',sort=list(phases)).scale(domain=list(phases),range=phase_colors(len(phases))).legend(orient='top')).interactive()
+
+TRANSMISSION_CURVES={'Sample':'green','Filter+Sample':'orange','Filter':'lightblue'}
+
+def transmission_data(dfTotalTransm4Plot, energyColumn=xct_engine.ENERGY_COLUMN):
+    ########### long-form (Energy, Curve, Transmission) of the transmission curves in the energy window
+    window=dfTotalTransm4Plot[energy_window(dfTotalTransm4Plot[energyColumn])]
+    return window.melt(id_vars=[energyColumn],value_vars=list(TRANSMISSION_CURVES),var_name='Curve',value_name='Transmission').round({'Transmission':3})
+
+def transmission_chart(data):
+    ###################### Plot total transmission ########################################
+    return alt.Chart(data,width='container',height=400
+                    ).mark_line(clip=True).encode(x=alt.X('Energy (kV):Q').scale(domain=(20,ENERGY_WINDOW[1])),
+                                         y=alt.Y('Transmission:Q',title='Total Transmission (%)').scale(domain=(0,100)),
+                                         color=alt.Color('Curve:N').scale(domain=list(TRANSMISSION_CURVES),range=list(TRANSMISSION_CURVES.values())).legend(None)).interactive()
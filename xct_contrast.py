@@ -0,0 +1,77 @@
+#Contrast between phases: the relative difference of the attenuation coefficients of every pair of phases of the database at
+#every energy is computed once per snapshot as a (nPhases,nPhases,nEnergies) tensor with its cumulative sum along the energy,
+#so the mean contrast of any pair over any energy window is a subtraction. For the selected phases it recommends the energy
+#window (and Maximum Energy) that maximizes the contrast of the least contrasted pair.
+import numpy as np
+import xct_engine
+
+CONTRAST_THRESHOLD=0.05                  # pairs below this relative contrast are hard to distinguish in the grey values
+MINIMUM_WINDOW=20                        # kV, narrowest energy window considered (the tube spectrum is broad)
+TOLERANCE=0.01                           # windows within 1% of the best contrast are equivalent, the highest energies are preferred
+
+class ContrastTable:
+    def __init__(self, phaseTable, maximumEnergy=xct_engine.MAXIMUM_ENERGIES.max()):
+        columns=phaseTable.energy<=maximumEnergy
+        self.phaseTable=phaseTable
+        self.energy=phaseTable.energy[columns]
+        attenuation=phaseTable.attenuation[:,columns]
+        total=attenuation[:,None,:]+attenuation[None,:,:]
+        ########### relative contrast 2|mu_i-mu_j|/(mu_i+mu_j), 0 (no contrast) to 2
+        self.contrast=np.divide(2*np.abs(attenuation[:,None,:]-attenuation[None,:,:]),total,out=np.zeros_like(total),where=total>0)
+        self.cumulative=np.concatenate([np.zeros(self.contrast.shape[:2]+(1,)),np.cumsum(self.contrast,axis=-1)],axis=-1)
+
+    def window_contrast(self, lower, upper):
+        ########### mean contrast of all the pairs of phases over the energies in [lower, upper] (kV), (...,nPhases,nPhases)
+        ########### for arrays of windows, e.g. to screen which phases can be resolved in a sweep of samples. nan if the
+        ########### window has no energy of the database
+        a=np.searchsorted(self.energy,np.asarray(lower,dtype=float),side='left')
+        b=np.searchsorted(self.energy,np.asarray(upper,dtype=float),side='right')
+        a,b=np.broadcast_arrays(a,b)
+        summed=np.moveaxis(self.cumulative[:,:,b]-self.cumulative[:,:,a],(0,1),(-2,-1))
+        count=np.asarray(b-a)[...,None,None]
+        return np.divide(summed,count,out=np.full(summed.shape,np.nan),where=count>0)
+
+    def worst_contrast(self, selected, lower, upper):
+        ########### lowest contrast between the selected phases (...,nPhases boolean mask of the rows) in the window(s),
+        ########### inf with less than 2 phases
+        pairs=selected[...,:,None]&selected[...,None,:]&~np.eye(len(self.phaseTable.names),dtype=bool)
+        return np.where(pairs,self.window_contrast(lower,upper),np.inf).min(axis=(-2,-1))
+
+    def resolvable(self, phases, lower, upper, threshold=CONTRAST_THRESHOLD):
+        ########### whether every pair of the given phases has at least threshold contrast in the window(s)
+        selected=np.zeros(len(self.phaseTable.names),dtype=bool)
+        selected[self.phaseTable.rows(list(phases))]=True
+        return self.worst_contrast(selected,lower,upper)>=threshold
+
+    def best_window(self, phases, minimumEnergy=None, minimumWidth=MINIMUM_WINDOW, threshold=CONTRAST_THRESHOLD):
+        ########### energy window [lower, upper] (kV) above minimumEnergy (e.g. the energy at which the sample transmits) that
+        ########### maximizes the worst-case contrast of the pairs of phases, all the windows are evaluated at once. Among
+        ########### equivalent windows the one with the highest energies is chosen (shorter scans, see the tips of the app).
+        ########### Returns None for less than 2 phases or if there is no window, the pairs that are below threshold in any
+        ########### window are listed as indistinguishable
+        names=list(dict.fromkeys(phases))
+        if len(names)<2:
+            return None
+        rows=self.phaseTable.rows(names)
+        first,second=np.triu_indices(len(names),k=1)
+        cumulative=self.cumulative[rows[first],rows[second]]                          # (nPairs,nEnergies+1)
+        summed=cumulative[:,None,1:]-cumulative[:,:-1,None]                           # (nPairs,first energy,last energy)
+        start=np.arange(len(self.energy))[:,None]
+        last=np.arange(len(self.energy))[None,:]
+        valid=(last>=start)&(self.energy[last]-self.energy[start]>=minimumWidth)
+        if minimumEnergy is not None:
+            valid&=self.energy[start]>=minimumEnergy
+        if not valid.any():
+            return None
+        contrast=np.where(valid,summed/np.maximum(last-start+1,1),-np.inf)
+        worst=contrast.min(axis=0)
+        equivalent=worst>=worst.max()-TOLERANCE*abs(worst.max())
+        b=np.flatnonzero(equivalent.any(axis=0))[-1]
+        a=np.flatnonzero(equivalent[:,b])[-1]
+        best=contrast.max(axis=(1,2))                                                  # best window of each pair
+        lower,upper=float(self.energy[a]),float(self.energy[b])
+        step=xct_engine.MAXIMUM_ENERGIES[1]-xct_engine.MAXIMUM_ENERGIES[0]
+        weakest=np.argmin(contrast[:,a,b])
+        return {'lower':lower,'upper':upper,'maximumEnergy':float(min(np.ceil(upper/step)*step,xct_engine.MAXIMUM_ENERGIES.max())),
+                'contrast':float(worst[a,b]),'weakestPair':(names[first[weakest]],names[second[weakest]]),
+                'indistinguishable':[(names[i],names[j]) for i,j,c in zip(first,second,best) if c<threshold]}
@@ -0,0 +1,137 @@
+#Local snapshot cache of the database of attenuation coefficients. The table downloaded from google sheets is stored on disk as
+#a float matrix with one row per column of the table (.npy, memory-mapped when read) plus a json index with the column names,
+#so a new server process starts from the last snapshot without a network round trip and survives outages of the upstream.
+import contextlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+logger=logging.getLogger(__name__)
+
+FORMAT=1                                                                 # layout of the files, bump if it changes
+SNAPSHOT_NAME='attenuation'
+SNAPSHOT_DIR=os.environ.get('XCT_SNAPSHOT_DIR',
+                            os.path.join(os.environ.get('XDG_CACHE_HOME',os.path.expanduser('~/.cache')),'xct-explorer'))
+SNAPSHOT_TTL=float(os.environ.get('XCT_SNAPSHOT_TTL',24*3600))            # seconds before the snapshot is refreshed
+OFFLINE=os.environ.get('XCT_OFFLINE','').lower() in ('1','true','yes')    # never contact the upstream, serve the last snapshot
+RETRY_DELAY=300                                                          # seconds between refresh attempts after a failure
+KEEP_VERSIONS=3                                                          # older snapshots are deleted
+
+class SnapshotUnavailable(RuntimeError):
+    pass
+
+def _index_path(directory):
+    return os.path.join(directory,f'{SNAPSHOT_NAME}.json')
+
+def _matrix_path(directory, version):
+    return os.path.join(directory,f'{SNAPSHOT_NAME}-v{version:06d}.npy')
+
+def read_index(directory=SNAPSHOT_DIR):
+    ########### metadata of the current snapshot or None if there is no (compatible) snapshot
+    try:
+        with open(_index_path(directory)) as file:
+            index=json.load(file)
+    except (OSError,ValueError):
+        return None
+    return index if index.get('format')==FORMAT else None
+
+def _replace(path, write, mode='wb'):
+    ########### writes through a unique temporary file in the same folder and renames it, so several processes refreshing at
+    ########### the same time never write the same file
+    handle,temporary=tempfile.mkstemp(dir=os.path.dirname(path),prefix=os.path.basename(path)+'.',suffix='.tmp')
+    try:
+        with os.fdopen(handle,mode) as file:
+            write(file)
+        os.replace(temporary,path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temporary)
+        raise
+
+def write_snapshot(frame, directory=SNAPSHOT_DIR):
+    ########### stores the table as a new version. The index is replaced last, so readers never see a partial snapshot
+    os.makedirs(directory,exist_ok=True)
+    previous=read_index(directory)
+    version=previous['version']+1 if previous else 1
+    matrix=np.ascontiguousarray(frame.to_numpy(dtype=float).T)            # columnar: one row per column of the table
+    _replace(_matrix_path(directory,version),lambda file: np.save(file,matrix))
+    index={'format':FORMAT,'version':version,'created':time.time(),'columns':[str(c) for c in frame.columns],'shape':list(matrix.shape)}
+    _replace(_index_path(directory),lambda file: json.dump(index,file),'w')
+    for old in range(max(version-KEEP_VERSIONS,0),0,-1):
+        if not os.path.exists(_matrix_path(directory,old)):
+            break
+        with contextlib.suppress(FileNotFoundError):                    # removed by another process
+            os.remove(_matrix_path(directory,old))
+    return index
+
+def read_snapshot(directory=SNAPSHOT_DIR):
+    ########### (table, metadata) of the current snapshot, the values are memory-mapped and not copied into memory
+    index=read_index(directory)
+    if index is None:
+        raise SnapshotUnavailable(f'No snapshot of the attenuation database in {directory}')
+    matrix=np.load(_matrix_path(directory,index['version']),mmap_mode='r')
+    return pd.DataFrame(matrix.T,columns=index['columns'],copy=False), index
+
+class AttenuationStore:
+    ########### serves the database from the snapshot and refreshes it from fetch() in a background thread once it is
+    ########### older than ttl. The table in memory is swapped in one assignment, readers get either the old or the new one
+    def __init__(self, fetch, directory=SNAPSHOT_DIR, ttl=SNAPSHOT_TTL, offline=OFFLINE):
+        self.fetch=fetch
+        self.directory=directory
+        self.ttl=ttl
+        self.offline=offline
+        self._lock=threading.Lock()
+        self._refreshing=False
+        self._lastAttempt=0.0
+        try:
+            self._current=read_snapshot(directory)           # (table, metadata)
+        except (SnapshotUnavailable,OSError,ValueError):
+            if offline:
+                raise SnapshotUnavailable(f'Offline mode and no snapshot of the attenuation database in {directory}')
+            self._current=(None,None)
+            self.refresh()                                   # first start: nothing to serve until the upstream answers
+
+    @property
+    def metadata(self):
+        return self._current[1]
+
+    def age(self):
+        return time.time()-self.metadata['created']
+
+    def snapshot(self):
+        ########### (table, metadata) read at once, so the table always matches its version even if a refresh swaps them
+        current=self._current
+        if not self.offline and time.time()-current[1]['created']>self.ttl and time.time()-self._lastAttempt>RETRY_DELAY:
+            self.refresh(background=True)
+        return current
+
+    def table(self):
+        return self.snapshot()[0]
+
+    def refresh(self, background=False):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing=True
+            self._lastAttempt=time.time()
+        if background:
+            threading.Thread(target=self._refresh,name='xct-database-refresh',daemon=True).start()
+        else:
+            self._refresh(raiseErrors=True)
+
+    def _refresh(self, raiseErrors=False):
+        try:
+            frame=self.fetch()
+            write_snapshot(frame,self.directory)
+            self._current=read_snapshot(self.directory)
+        except Exception:
+            if raiseErrors:
+                raise
+            logger.warning('Refresh of the attenuation database failed, serving snapshot v%s',self.metadata['version'],exc_info=True)
+        finally:
+            self._refreshing=False
@@ -0,0 +1,353 @@
+#Headless planning engine of the XCT-Explorer. Contains all the physics of the app (voxel size, Lambert-Beer transmission,
+#filter selection and the empirical scan time) as pure NumPy functions without streamlit, so that many scan scenarios
+#can be evaluated in one broadcasted call. The streamlit app (xct_explorer_270824.py) is a thin client of this module.
+import functools
+import numpy as np
+from scipy.optimize import curve_fit
+import xct_scanners
+
+############################################ Options of the app ######################################################
+PURPOSES=('Qualitative','Quantify','Classify')
+FILTER_MODES=('No Filter','Fast','Ideal')
+ENERGY_COLUMN='Energy (kV)'               # column of the database with the energies, all the others are phases
+FILTER_PHASE='Cu'                         # phase of the database used as filter
+MAXIMUM_ENERGIES=np.arange(0,185,5)       # steps of the Maximum Energy slider (kV)
+
+########################################## Scanner configuration ###############################################
+########### the calibration and the time model of every scanner are read from scanners/*.json (see xct_scanners.py) and
+########### looked up by [scanner, binning, detector]. Every function takes the scanner, so scanners broadcast like any input
+SCANNERS=xct_scanners.load()
+DEFAULT_SCANNER=xct_scanners.DEFAULT_SCANNER if xct_scanners.DEFAULT_SCANNER in SCANNERS.names else SCANNERS.names[0]
+BINNINGS,DETECTORS=SCANNERS.options(DEFAULT_SCANNER)  # binning factor ('1x','2x','3x' in the app) and detector width (px)
+PURPOSE_FACTOR=np.array([3,5,7])                     # minimum feature in voxels for each purpose
+MAXIMUM_FILTER_THICKNESS=2.5                         # mm of Cu
+FILTER_CACHE_SIZE=1024                               # mixtures kept by filter_solver
+FILTER_THICKNESS_STEP=0.05                           # mm of Cu, step of the grid of the spectrum table
+
+_lookup=xct_scanners.lookup
+
+def _two_product(a, b):
+    ########### a*b as the rounded product and its exact error (Dekker), elementwise
+    def split(x):
+        c=134217729.0*x                                              # 2**27+1
+        high=c-(c-x)
+        return high,x-high
+    product=a*b
+    aHigh,aLow=split(a)
+    bHigh,bLow=split(b)
+    return product,((aHigh*bHigh-product)+aHigh*bLow+aLow*bHigh)+aLow*bLow
+
+def round_decimals(values, decimals=1):
+    ########### same result as python's round(value, decimals) used by previous versions of the app, for arrays. np.round
+    ########### rounds the product values*10**decimals, which can land exactly on .5 and then round the other way (e.g. 6.55 h)
+    scale=10.0**decimals
+    scaled,error=_two_product(np.asarray(values,dtype=float),scale)
+    rounded=np.rint(scaled)
+    tie=np.abs(scaled-rounded)==0.5                                    # the exact value is on one side of the tie
+    rounded=np.where(tie&(error>0),np.ceil(scaled),np.where(tie&(error<0),np.floor(scaled),rounded))
+    return rounded/scale
+
+############################################## Geometry ######################################################
+def voxel_size(diameter, binning, detector, scanner=DEFAULT_SCANNER):
+    ########### linear correlations between the sample diameter (mm) and the voxel size (um) of the scanner
+    s,b,c=SCANNERS.index(scanner,binning,detector)
+    return np.trunc(SCANNERS.voxelSlope[s,b,c]*np.asarray(diameter)+SCANNERS.voxelIntercept[s,b,c]).astype(int)
+
+def data_size(binning, detector, scanner=DEFAULT_SCANNER):
+    return SCANNERS.dataSize[SCANNERS.index(scanner,binning,detector)]
+
+def minimum_feature(voxelSize, purpose):
+    return np.asarray(voxelSize)*PURPOSE_FACTOR[_lookup(purpose,PURPOSES,'purpose')]
+
+def maximum_diameter(minimumFeature, binning, detector, purpose, scanner=DEFAULT_SCANNER):
+    ########### inverse of voxel_size: largest diameter (mm) for which the minimum feature does not exceed the given one.
+    ########### nan if not even the smallest voxel size is fine enough
+    voxelSize=np.floor(np.asarray(minimumFeature)/PURPOSE_FACTOR[_lookup(purpose,PURPOSES,'purpose')])
+    s,b,c=SCANNERS.index(scanner,binning,detector)
+    diameter=np.nextafter((voxelSize+1-SCANNERS.voxelIntercept[s,b,c])/SCANNERS.voxelSlope[s,b,c],0)      # voxel_size truncates, the bound is excluded
+    return np.where(voxelSize>=1,diameter,np.nan)
+
+############################################## Composition ######################################################
+class PhaseTable:
+    ########### the database of attenuation coefficients (cm-1) held once as a contiguous (nPhases,nEnergies) array
+    ########### with a name->row index, so any number of phases is combined with a single matrix product
+    def __init__(self, energy, names, attenuation):
+        self.energy=np.ascontiguousarray(energy,dtype=float)
+        self.names=tuple(names)
+        self.attenuation=np.ascontiguousarray(attenuation,dtype=float)
+        self.index={name:row for row,name in enumerate(self.names)}
+        if self.attenuation.shape!=(len(self.names),len(self.energy)):
+            raise ValueError(f'attenuation has shape {self.attenuation.shape}, expected {(len(self.names),len(self.energy))}')
+
+    @classmethod
+    def from_frame(cls, frame, energyColumn=ENERGY_COLUMN):
+        ########### one column per phase as in the app database. A frame read from a snapshot is not copied
+        columns=[str(column) for column in frame.columns]
+        matrix=frame.to_numpy(dtype=float).T
+        phases=[row for row,column in enumerate(columns) if column!=energyColumn]
+        attenuation=matrix[1:] if phases==list(range(1,len(columns))) else matrix[phases]
+        return cls(matrix[columns.index(energyColumn)],[columns[row] for row in phases],attenuation)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, phase):
+        return self.attenuation[self.rows(phase)]
+
+    def rows(self, phases):
+        try:
+            return np.vectorize(self.index.__getitem__,otypes=[int])(phases) if np.ndim(phases) else self.index[phases]
+        except KeyError as error:
+            raise KeyError(f'Unknown phase {error.args[0]!r}, the database contains {list(self.names)}') from None
+
+    def weights(self, phases, fractions):
+        ########### volume fractions (...,len(phases)) of the selected phases spread over all the rows of the table (...,nPhases).
+        ########### Repeated phases add up
+        fractions=np.asarray(fractions,dtype=float)
+        weights=np.zeros(fractions.shape[:-1]+(len(self.names),))
+        np.add.at(np.moveaxis(weights,-1,0),self.rows(list(phases)),np.moveaxis(fractions,-1,0))
+        return weights
+
+    def mixture(self, phases, fractions):
+        ########### linear attenuation coefficient of the mixture (...,nEnergies)
+        return self.weights(phases,fractions)@self.attenuation
+
+    def transmission(self, phases, fractions, diameter):
+        return sample_transmission(self.attenuation,self.weights(phases,fractions),diameter)
+
+def sample_transmission(attenuation, fractions, diameter):
+    ########### Lambert-Beer law applied to the phases (rows of attenuation, cm-1), volume fractions and diameter (mm)
+    ########### attenuation (nPhases,nEnergies), fractions (...,nPhases), diameter (...) -> transmission in % (...,nEnergies)
+    mixture=np.asarray(fractions,dtype=float)@np.asarray(attenuation,dtype=float)
+    return np.exp(-mixture*np.asarray(diameter,dtype=float)[...,None]/10)*100
+
+def transmission_energy(energy, totalTransm, transmission):
+    ########### energy (kV) at which the sample transmits the given percentage, by linear interpolation of log-transmission
+    ########### vs energy. Absorption edges are smoothed with a running maximum so that every curve is monotone.
+    ########### Transmissions outside of the database range are clamped to the first/last energy
+    energy=np.asarray(energy,dtype=float)
+    logTransm=np.maximum.accumulate(np.log(np.maximum(np.asarray(totalTransm,dtype=float),1e-300)),axis=-1)
+    target=np.log(np.asarray(transmission,dtype=float))[...,None]
+    above=logTransm>=target
+    upper=np.where(above.any(axis=-1),np.argmax(above,axis=-1),len(energy)-1)
+    lower=np.maximum(upper-1,0)
+    y0=np.take_along_axis(logTransm,lower[...,None],axis=-1)[...,0]
+    y1=np.take_along_axis(logTransm,upper[...,None],axis=-1)[...,0]
+    step=np.where(y1>y0,y1-y0,1.0)
+    weight=np.clip((target[...,0]-y0)/step,0,1)
+    return energy[lower]+weight*(energy[upper]-energy[lower])
+
+def filter_coefficient(energy, attFilter, atEnergy):
+    ########### attenuation coef. of the filter (cm-1) at any energy, by log-log interpolation of the database column
+    return np.exp(np.interp(np.log(atEnergy),np.log(np.asarray(energy,dtype=float)),np.log(np.asarray(attFilter,dtype=float))))
+
+def filter_attenuation(energy, totalTransm, attFilter):
+    ########### energy at 10% and 1% transmission through the sample and the attenuation coef. of the filter at these energies
+    ########### totalTransm (...,nEnergies), all the curves are solved at once
+    energyAt10percTransm=transmission_energy(energy,totalTransm,10)         # ideal case
+    energyAt1percTransm=transmission_energy(energy,totalTransm,1)           # fast case
+    return (energyAt10percTransm, energyAt1percTransm,
+            filter_coefficient(energy,attFilter,energyAt10percTransm), filter_coefficient(energy,attFilter,energyAt1percTransm))
+
+def filter_solver(phaseTable, filterPhase=FILTER_PHASE, maxsize=FILTER_CACHE_SIZE):
+    ########### memoized filter_attenuation on (phases, fractions, diameter) of a PhaseTable with a LRU bound
+    attFilter=phaseTable[filterPhase]
+    @functools.lru_cache(maxsize=maxsize)
+    def cached(mixture, diameter):
+        phases,fractions=zip(*mixture) if mixture else ((),())
+        return tuple(float(v) for v in filter_attenuation(phaseTable.energy,phaseTable.transmission(phases,fractions,diameter),attFilter))
+    def solve(phases, fractions, diameter):
+        ########### repeated phases are merged and phases without volume are dropped, so equivalent mixtures share the cache
+        mixture={}
+        for phase,fraction in zip(phases,fractions):
+            if fraction>0:
+                mixture[phase]=mixture.get(phase,0.0)+float(fraction)
+        return cached(tuple(sorted(mixture.items())),float(diameter))
+    solve.cache_info=cached.cache_info
+    solve.cache_clear=cached.cache_clear
+    return solve
+
+############################################## Legacy curve fit ######################################################
+def _fit_window(energy, totalTransm):
+    ########### uses a narrow range of values, excludes transmissions close to 0 and high energies where the transmission
+    ########### is constant with the energy. The first 5 datapoints are always kept to prevent errors of the curve fit
+    first=np.arange(len(energy))<5
+    return (energy<310)&(~first|(totalTransm>0.001))
+
+def EnVSTransm_function(x, a, b,c,d,e,f,g):
+    return (a+b*x+c*x*x+d*x*x*x+g*x*x*x*x)/(e*x+f*x*x+1)
+
+def AttVSEn_function(x, a, b,c,d,e,f,g):
+    return b+f*x+g*x*x/(b+c*x+a*x*x+d*x*x*x+e*x*x*x*x*x)
+
+def _fit_filter_attenuation(energy, totalTransm, attFilter):
+    window=_fit_window(energy,totalTransm)
+    try:
+        params, covariance = curve_fit(EnVSTransm_function, totalTransm[window], energy[window])
+        energyAt10percTransm=EnVSTransm_function(10,*params)
+        energyAt1percTransm=EnVSTransm_function(1,*params)
+        params, covariance = curve_fit(AttVSEn_function, energy[window], attFilter[window])
+    except RuntimeError:                                             # the fit did not converge
+        return (np.nan,)*4
+    return (energyAt10percTransm, energyAt1percTransm,
+            AttVSEn_function(energyAt10percTransm,*params), AttVSEn_function(energyAt1percTransm,*params))
+
+def filter_attenuation_fit(energy, totalTransm, attFilter):
+    ########### same as filter_attenuation using the rational functions fitted with curve_fit in previous versions of the app.
+    ########### Each distinct transmission curve is fitted once, curves where the fit does not converge give nan
+    energy=np.asarray(energy,dtype=float)
+    attFilter=np.asarray(attFilter,dtype=float)
+    totalTransm=np.asarray(totalTransm,dtype=float)
+    curves, inverse=np.unique(totalTransm.reshape(-1,totalTransm.shape[-1]),axis=0,return_inverse=True)
+    fitted=np.array([_fit_filter_attenuation(energy,curve,attFilter) for curve in curves])
+    fitted=fitted[inverse.reshape(-1)].reshape(totalTransm.shape[:-1]+(4,))
+    return tuple(np.moveaxis(fitted,-1,0))
+
+def fit_diagnostics(energy, totalTransm, attFilter):
+    ########### convergence, function evaluations and rms residual of the two legacy curve fits of one transmission curve:
+    ########### energy vs transmission (kV) and attenuation of the filter vs energy (cm-1)
+    energy=np.asarray(energy,dtype=float)
+    attFilter=np.asarray(attFilter,dtype=float)
+    totalTransm=np.asarray(totalTransm,dtype=float)
+    window=_fit_window(energy,totalTransm)
+    diagnostics={'points':int(window.sum())}
+    for curve,function,x,y in (('energy',EnVSTransm_function,totalTransm[window],energy[window]),
+                               ('filter',AttVSEn_function,energy[window],attFilter[window])):
+        try:
+            params, covariance, info, message, flag = curve_fit(function, x, y, full_output=True)
+        except RuntimeError:
+            diagnostics.update({f'{curve}Converged':False,f'{curve}Evaluations':np.nan,f'{curve}Residual':np.nan})
+            continue
+        diagnostics.update({f'{curve}Converged':True,f'{curve}Evaluations':int(info['nfev']),
+                            f'{curve}Residual':float(np.sqrt(np.mean(info['fvec']**2)))})
+    return diagnostics
+
+def fit_deviation(energy, totalTransm, attFilter, filterMode='Ideal'):
+    ########### compatibility mode: deviation of the interpolation from the legacy curve fit (interpolated - fitted)
+    names=('energyAt10percTransm','energyAt1percTransm','attCoefFiltAt10percTransm','attCoefFiltAt1percTransm')
+    interpolated=filter_attenuation(energy,totalTransm,attFilter)
+    fitted=filter_attenuation_fit(energy,totalTransm,attFilter)
+    interpolated+=(filter_thickness(filterMode,interpolated[2],interpolated[3])[0],)
+    fitted+=(filter_thickness(filterMode,fitted[2],fitted[3])[0],)
+    deviation={}
+    for name,new,old in zip(names+('filterThickness',),interpolated,fitted):
+        deviation[name]={'interpolated':new,'fitted':old,'difference':new-old,
+                         'relative':np.divide(new-old,np.abs(old),out=np.full(np.shape(old),np.nan),where=np.abs(old)>0)}
+    return deviation
+
+def filter_thickness(filterMode, attCoefFiltAt10percTransm, attCoefFiltAt1percTransm):
+    ########### thickness (mm of Cu) for the selected filter option and whether it was limited by a low transmission
+    mode=_lookup(filterMode,FILTER_MODES,'filter mode')
+    ideal=-(np.log(0.2)*10)/np.asarray(attCoefFiltAt10percTransm)
+    fast=-(np.log(0.5)*10)/np.asarray(attCoefFiltAt1percTransm)
+    lowTransmission=(mode==2)&(ideal>MAXIMUM_FILTER_THICKNESS)
+    thickness=np.select([mode==2,mode==1],[np.minimum(ideal,MAXIMUM_FILTER_THICKNESS),fast],0.0)
+    return thickness, lowTransmission
+
+def filter_thicknesses(attFilter, step=FILTER_THICKNESS_STEP):
+    ########### grid of thicknesses (mm of Cu) up to the thickest filter filter_thickness can return with this filter: the Fast
+    ########### option is not limited and is thickest where the filter attenuates least (coefficients are interpolated in range)
+    largest=max(MAXIMUM_FILTER_THICKNESS,float(filter_thickness('Fast',np.inf,np.min(attFilter))[0]))
+    return np.arange(0,np.ceil(largest/step-1e-9)*step+step/2,step)
+
+def filter_transmission(attFilter, filterThickness):
+    return np.exp(-np.asarray(attFilter)*np.asarray(filterThickness,dtype=float)[...,None]/10)*100
+
+############################################## Polychromatic spectrum ######################################################
+def tube_spectrum(energy, maximumEnergy):
+    ########### relative signal of an energy integrating detector per energy bin for a tube at maximumEnergy (kV): Kramers' law
+    ########### for the number of photons, N(E) ~ (Emax-E)/E, weighted by the energy. (...,nEnergies), 0 above Emax
+    energy=np.asarray(energy,dtype=float)
+    return np.maximum(np.asarray(maximumEnergy,dtype=float)[...,None]-energy,0)*np.gradient(energy)
+
+class SpectrumTable:
+    ########### tube spectra for every step of the Maximum Energy slider filtered by every thickness of the grid, normalized
+    ########### and precomputed once as a tensor (2,nMaximumEnergies,nThicknesses,nEnergies): [0] is the spectrum and [1] the
+    ########### spectrum times the energy. Evaluating a sample is then a single contraction with its transmission
+    def __init__(self, energy, attFilter, maximumEnergies=MAXIMUM_ENERGIES, thicknesses=None):
+        self.maximumEnergies=np.asarray(maximumEnergies,dtype=float)
+        self.thicknesses=filter_thicknesses(attFilter) if thicknesses is None else np.asarray(thicknesses,dtype=float)
+        energy=np.asarray(energy,dtype=float)
+        self.columns=int(np.searchsorted(energy,self.maximumEnergies.max(),side='right'))    # energies above every Emax have no weight
+        self.energy=energy[:self.columns]
+        spectrum=tube_spectrum(self.energy,self.maximumEnergies)[:,None,:]*filter_transmission(np.asarray(attFilter)[:self.columns],self.thicknesses)[None,:,:]/100
+        total=spectrum.sum(axis=-1,keepdims=True)
+        spectrum=np.divide(spectrum,total,out=np.zeros_like(spectrum),where=total>0)     # no spectrum below the first energy
+        self.tensor=np.ascontiguousarray(np.stack([spectrum,spectrum*self.energy]))
+        self.meanEnergy=np.where(total[...,0]>0,self.tensor[1].sum(axis=-1),np.nan)   # of the beam reaching the sample (kV)
+
+    @classmethod
+    def from_phase_table(cls, phaseTable, filterPhase=FILTER_PHASE, **grid):
+        return cls(phaseTable.energy,phaseTable[filterPhase],**grid)
+
+    def evaluate(self, totalTransm):
+        ########### totalTransm (...,nEnergies) in % -> for every Emax and thickness (...,nMaximumEnergies,nThicknesses):
+        ########### the effective transmission of the spectrum (%), the mean energy of the transmitted spectrum (kV) and the
+        ########### beam hardening, the shift of the mean energy through the sample (kV)
+        transmitted=np.tensordot(np.asarray(totalTransm,dtype=float)[...,:self.columns],self.tensor,axes=([-1],[-1]))
+        transmitted=np.moveaxis(transmitted,-3,0)                      # (2,...,nMaximumEnergies,nThicknesses)
+        effective=np.where(np.isnan(self.meanEnergy),np.nan,transmitted[0])
+        meanEnergy=np.divide(transmitted[1],transmitted[0],out=np.full(transmitted[0].shape,np.nan),where=transmitted[0]>0)
+        return {'effectiveTransmission':effective,'meanEnergy':meanEnergy,'beamHardening':meanEnergy-self.meanEnergy}
+
+    def lookup(self, values, maximumEnergy, filterThickness):
+        ########### value at the Emax step (nearest) and filter thickness (linear interpolation) from (...,nMaximumEnergies,nThicknesses).
+        ########### nan for thicknesses outside of the grid
+        e=np.abs(self.maximumEnergies-np.asarray(maximumEnergy,dtype=float)[...,None]).argmin(axis=-1)
+        filterThickness=np.asarray(filterThickness,dtype=float)
+        t=np.clip(filterThickness,self.thicknesses[0],self.thicknesses[-1])
+        upper=np.clip(np.searchsorted(self.thicknesses,t),1,len(self.thicknesses)-1)
+        weight=(t-self.thicknesses[upper-1])/(self.thicknesses[upper]-self.thicknesses[upper-1])
+        values=np.asarray(values)
+        index=np.indices(np.broadcast_shapes(values.shape[:-2],e.shape,t.shape),sparse=True)
+        values=np.broadcast_to(values,np.broadcast_shapes(values.shape[:-2],e.shape,t.shape)+values.shape[-2:])
+        value=(1-weight)*values[(*index,e,upper-1)]+weight*values[(*index,e,upper)]
+        return np.where(t==filterThickness,value,np.nan)
+
+############################################## Time ######################################################
+def scan_time(binning, detector, filterThickness, maximumEnergy, voxelSize, scanner=DEFAULT_SCANNER, coefficients=None):
+    ########### empirical equations of the scanner (hrs), per binning:
+    ########### scanTime=(a*filterThickness+b*maximumEnergy+c*power+d)*cameraFactor
+    ########### coefficients (...,4) replace [a,b,c,d] of the scanner, e.g. to propagate their uncertainty
+    s,b,c=SCANNERS.index(scanner,binning,detector)
+    power=np.maximum(voxelSize,SCANNERS.minimumPower[s])              # the power (W) equals the voxel size except bellow the minimum
+    a,e,p,d=np.moveaxis(SCANNERS.timeCoefficients[s,b] if coefficients is None else np.asarray(coefficients,dtype=float),-1,0)
+    scanTime=round_decimals((a*np.asarray(filterThickness)+e*np.asarray(maximumEnergy)+p*power+d)*SCANNERS.cameraFactor[s,c],1)
+    return np.maximum(scanTime,SCANNERS.minimumScanTime[s])
+
+def experiment_time(scanTime, numberScans=1, scanner=DEFAULT_SCANNER):
+    ########### the warmup and set up of the scanner is added to every scan
+    warmupTime=SCANNERS.warmupTime[_lookup(scanner,SCANNERS.names,'scanner')]
+    return round_decimals((np.asarray(scanTime)+warmupTime)*np.asarray(numberScans),1)
+
+def long_scan(binning, detector, scanTime, scanner=DEFAULT_SCANNER):
+    ########### scan times (hrs) above which the experiment time is shown in red
+    return np.asarray(scanTime)>SCANNERS.longScanTime[SCANNERS.index(scanner,binning,detector)]
+
+############################################## Whole plan ######################################################
+def plan(diameter, binning, detector, purpose, fractions, attenuation, energy, attFilter,
+         filterMode='Ideal', maximumEnergy=160, numberScans=1, scanner=DEFAULT_SCANNER, timeCoefficients=None):
+    ########### evaluates all the scenarios at once, every input is broadcasted against the others (several scanners too)
+    ########### fractions (...,nPhases) are the volume fractions of the phases in the rows of attenuation (nPhases,nEnergies)
+    ########### and timeCoefficients (...,4) replace those of the scanner (see scan_time)
+    fractions=np.asarray(fractions,dtype=float)
+    shape=np.broadcast_shapes(np.shape(diameter),np.shape(binning),np.shape(detector),np.shape(purpose),fractions.shape[:-1],
+                              np.shape(filterMode),np.shape(maximumEnergy),np.shape(numberScans),np.shape(scanner),
+                              np.shape(timeCoefficients)[:-1] if timeCoefficients is not None else ())
+    diameter=np.broadcast_to(diameter,shape)
+    voxelSize=voxel_size(diameter,binning,detector,scanner)
+    totalTransm=sample_transmission(attenuation,np.broadcast_to(fractions,shape+fractions.shape[-1:]),diameter)
+    energyAt10percTransm,energyAt1percTransm,attCoefFiltAt10percTransm,attCoefFiltAt1percTransm=filter_attenuation(energy,totalTransm,attFilter)
+    filterThickness,lowTransmission=filter_thickness(filterMode,attCoefFiltAt10percTransm,attCoefFiltAt1percTransm)
+    scanTime=scan_time(binning,detector,filterThickness,maximumEnergy,voxelSize,scanner,timeCoefficients)
+    return {'voxelSize':voxelSize,
+            'minimumFeature':np.broadcast_to(minimum_feature(voxelSize,purpose),shape),
+            'DataSize':np.broadcast_to(data_size(binning,detector,scanner),shape),
+            'filterThickness':filterThickness,
+            'energyAt10percTransm':energyAt10percTransm,
+            'energyAt1percTransm':energyAt1percTransm,
+            'scanTime':scanTime,
+            'experimentTime':np.broadcast_to(experiment_time(scanTime,numberScans,scanner),shape),
+            'lowTransmission':lowTransmission,
+            'lowCounts':energyAt10percTransm>np.asarray(maximumEnergy),
+            'longScan':np.broadcast_to(long_scan(binning,detector,scanTime,scanner),shape)}
@@ -2,12 +2,23 @@
 import numpy as np
 import pandas as pd
 import streamlit as st
-import altair as alt
-from scipy.optimize import curve_fit
 from streamlit_gsheets import GSheetsConnection
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import xct_engine
+import xct_database
+import xct_nodes
+import xct_planner
+import xct_charts
+import xct_metrics
+import xct_contrast
+import xct_uncertainty
 
 st.set_page_config(layout='wide',page_title='XCT-Explorer v270824')
-tabCitation, tabInstructions, tabGeometry, tabComposition =st.tabs(['Disclosure','Instructions',':blue[Geometric Parameters]',':violet[Composition Parameters]'])
+debug=st.query_params.get('debug')=='1'          # hidden debug panel at the bottom of the page: add ?debug=1 to the url
+metrics=debug or xct_metrics.ENABLED             # instrumentation of the rerun (see xct_metrics.py)
+if metrics:
+    xct_metrics.start_run()
+tabCitation, tabInstructions, tabGeometry, tabComposition, tabPlanner =st.tabs(['Disclosure','Instructions',':blue[Geometric Parameters]',':violet[Composition Parameters]',':orange[Planner]'])
 
 with tabCitation:
     st.write('The XCT-Explorer is a graphic user interface designed to be an intuitive and interactive tool to help planning CT experiments according to a step-by-step protocol (see **instructions** tab). This should allow for an interactive balancing of various scanning parametes and for a first assessment of the feasibility of experiments. Details about the protocol and the equations that link the various parameters can be found in "citation".')
@@ -29,7 +40,7 @@ with tabInstructions:
     st.write('**Tip:** Different combinations of binning and detector size may give the same voxel size. In this case choose the combination with higher binning as that reduces the scan time and the data size')
     st.write(' **Step 2: Define the Composition of the sample**')
     st.write('-	Click the :violet[Composition Parameters] tab')
-    st.write('-	Select up to 4 of the most relevant Phases in the sample')
+    st.write('-	Select the most relevant Phases in the sample')
     st.write('-	Input the approximate Volume Fraction for each phase')
     st.write('**Step 3: Tune the X-ray spectra**')
     st.write('-	Select a filter option')
@@ -40,19 +51,55 @@ with tabInstructions:
     st.write('-	If :red[Experiment Time] is red or warning pops out, consider reducing the scanning time to achieve images with higher quality')
     st.write('-	Confirm that the Experiment Time is realistic for your possibilities')
     st.write('**Tip:** to reduce the scanning time consider the following strategies: 1) reduce Diameter; 2) reduce Filter; 3)	increase Maximum Energy; 4) increase Binning, 5) decrease detector width')
-    st.write('Note 1: the equations linking the various parameters in the resolution tab is only valid for a specific scanner configuration ( in this version is a CoreTom from Tescan with detector size 2856x2856)')    
+    st.write('**Tip:** the :orange[Planner] tab searches all the combinations of Binning, Detector width, Filter and Maximum Energy for a target Minimum Feature Size and time budget')
+    st.write('Note 1: the equations linking the various parameters in the resolution tab is only valid for a specific scanner configuration ( in this version is a CoreTom from Tescan with detector size 2856x2856, other scanners can be added as profiles in the folder scanners)')    
     st.write('Note 2: the composition tab uses a database of phases adjusted from Hanna and Ketcham 2017 (10.1016/j.chemer.2017.01.006)')     
     st.write('Note 3: Consider the Experiment Time is just a rough approximation')
 
-@st.cache_data # Currently is using a database uploaded in google sheets. the scanner specific settings could also be loaded 
-def loadDatabase():
+def fetchDatabase(): # Currently is using a database uploaded in google sheets. the scanner specific settings could also be loaded 
     #url= "https://docs.google.com/spreadsheets/d/1t8-3UUnGjH2Nv7vF2iHoj5NkEFeWftml9qhTTv3fE4A/edit?usp=sharing"
     # Create a connection object.
     conn = st.connection("gsheets", type=GSheetsConnection)
-    phaseData = conn.read()       #if specific url is used (spreadsheet=url)
+    with xct_metrics.stage('database_fetch'):
+        phaseData = conn.read(ttl=0)       #if specific url is used (spreadsheet=url)
     return phaseData
-database=loadDatabase()
-allPhases= database.columns.values.tolist()
+@st.cache_resource # one store per server process: serves the snapshot on disk and refreshes it in the background (see xct_database.py)
+def attenuationStore():
+    return xct_database.AttenuationStore(fetchDatabase)
+def loadDatabase():
+    try:
+        store=attenuationStore()
+    except xct_database.SnapshotUnavailable as error:
+        st.error(f'The database of attenuation coefficients is not available: {error}')
+        xct_metrics.finish_run('aborted')           # st.stop() ends the rerun here
+        st.stop()
+    return store.snapshot()
+with xct_metrics.stage('database'):
+    database, databaseVersion=loadDatabase()
+if xct_metrics.PORT:
+    @st.cache_resource # Prometheus endpoint, one per server process
+    def metricsServer():
+        return xct_metrics.serve()
+    metricsServer()
+
+########### the builders are keyed by the version of the snapshot, the table of that version is passed unhashed (leading _)
+@st.cache_resource(max_entries=2) # the database as a (phases x energies) array, built once per snapshot
+def loadPhaseTable(version, _database):
+    return xct_engine.PhaseTable.from_frame(_database)
+phaseTable=loadPhaseTable(databaseVersion['version'],database)
+allPhases= list(phaseTable.names)
+
+@st.cache_resource(max_entries=2) # the energy at 10%/1% transmission is memoized for every (phases, fractions, diameter) across sessions
+def filterSolver(version, _phaseTable):
+    return xct_engine.filter_solver(_phaseTable)
+
+@st.cache_resource(max_entries=2) # contrast of every pair of phases at every energy, built once per snapshot
+def contrastTable(version, _phaseTable):
+    return xct_contrast.ContrastTable(_phaseTable)
+
+@st.cache_resource(max_entries=2) # filtered tube spectra for every Emax step and filter thickness, built once per snapshot
+def spectrumTable(version, _phaseTable):
+    return xct_engine.SpectrumTable.from_phase_table(_phaseTable)
 
 ############################################## state variables ######################################################    
 if 'diameter' not in st.session_state:
@@ -67,176 +114,174 @@ if 'maximumEnergy' not in st.session_state:
     st.session_state['maximumEnergy']=100
 if 'minimumFeature' not in st.session_state:
     st.session_state['minimumFeature']=30
+if 'nodes' not in st.session_state:
+    st.session_state['nodes']={}               # last inputs and result of every computation node
+st.session_state['inputs']={'phaseTable':phaseTable,'filterSolver':filterSolver(databaseVersion['version'],phaseTable),
+                            'spectrumTable':spectrumTable(databaseVersion['version'],phaseTable),
+                            'contrastTable':contrastTable(databaseVersion['version'],phaseTable)}
+def node(name):
+    ########### result of a computation node (see xct_nodes.py), only recomputed if one of its inputs changed
+    if xct_metrics.current() is None:
+        return xct_nodes.APP_GRAPH.evaluate(name,st.session_state['inputs'],st.session_state['nodes'])
+    solver=st.session_state['inputs']['filterSolver']
+    before=solver.cache_info()
+    recomputed=[]
+    result=xct_nodes.APP_GRAPH.evaluate(name,st.session_state['inputs'],st.session_state['nodes'],recomputed)
+    xct_metrics.cache(f'node_{name}',name not in recomputed)
+    after=solver.cache_info()
+    if after.hits>before.hits:
+        xct_metrics.cache('filter_solver',True)
+    elif after.misses>before.misses:
+        xct_metrics.cache('filter_solver',False)
+    return result
+def fragmentRerun():
+    ########### True if only fragments are rerun, not the whole script
+    context=get_script_run_ctx()
+    return context is not None and bool(context.fragment_ids_this_run)
+def pagedTable(label, frame, key, rows=20):
+    ########### the table is only sent to the browser when the toggle is on, one page of rows at a time
+    if not st.toggle(label,key=key):
+        return None
+    pages=max(-(-len(frame)//rows),1)
+    page=st.number_input(f'Page (1-{pages})',value=1,min_value=1,max_value=pages,step=1,key=f'{key}_page') if pages>1 else 1
+    table=frame.iloc[(page-1)*rows:page*rows]
+    st.table(table)
+    if metrics:
+        xct_metrics.payload(key,xct_metrics.payload_size(table))
+    return table
 st.sidebar.title(':blue[Resolution]', help='_"Resolution is not a value but more like a state of mind"_ It depends not only on the voxel size but also on the quality of the final image. Tip: Aim for the highest quality possible, which can save time post-processing the 3D image and will increase the quality of your research')
 
 ########################################## Define voxel size vs diameter #################################################
 ##############thi 
 def vs_diameter():
-    ########### this is specific of a scanner configuration ### linear equation based on 1920px width (bin1)
-    diameters=(12,40,150)                    # diameters 
-    VS_1920Bin1=np.array([6,22,83])          # VS for the given diameters. All other correlations are calculated relative to this
-    VS_2856Bin1=VS_1920Bin1*2/3
-    VS_1920Bin2=VS_1920Bin1*2
-    VS_2856Bin2=VS_1920Bin1*2/3*2
-    VS_1920Bin3=VS_1920Bin1*3
-    VS_2856Bin3=VS_1920Bin1*2/3*3          # this is the same as VS_1920Bin2, so only 5 lines are actually visible in the plot
-    ############################# plots ################################
-    RegressionData=pd.DataFrame({'Diameter':diameters,'VS_1920Bin1':VS_1920Bin1,'VS_2856Bin1':VS_2856Bin1,'VS_1920Bin2':VS_1920Bin2,'VS_2856Bin2':VS_2856Bin2,'VS_1920Bin3':VS_1920Bin3,'VS_2856Bin3':VS_2856Bin3})
-    plotVS_Diam2856B1 = alt.Chart(RegressionData,height=400, width=600).mark_point().encode(x=alt.X('VS_2856Bin1:Q',title='Voxel Size (µm)'),y=alt.Y('Diameter:Q',title='Diameter (mm)')).transform_regression('VS_2856Bin1', 'Diameter').mark_line(color='#17becf',opacity=0.8)
-    plotVS_Diam1920B1 = alt.Chart(RegressionData,height=400, width=600).mark_point().encode(x=alt.X('VS_1920Bin1:Q',title='Voxel Size (µm)'),y=alt.Y('Diameter:Q',title='Diameter (mm)')).transform_regression('VS_1920Bin1', 'Diameter').mark_line(color='#1f77b4',opacity=0.8)
-    plotVS_Diam2856B2 = alt.Chart(RegressionData,height=400,width=600).mark_point().encode(x=alt.X('VS_2856Bin2:Q',title='Voxel Size (µm)'),y=alt.Y('Diameter:Q',title='Diameter (mm)')).transform_regression('VS_2856Bin2', 'Diameter').mark_line(color='#ff7f0e',opacity=0.8)
-    plotVS_Diam1920B2 = alt.Chart(RegressionData,height=400,width=600).mark_point().encode(x=alt.X('VS_1920Bin2:Q',title='Voxel Size (µm)'),y=alt.Y('Diameter:Q',title='Diameter (mm)')).transform_regression('VS_1920Bin2', 'Diameter').mark_line(color='#ffbb78',opacity=0.8)
-    plotVS_Diam2856B3 = alt.Chart(RegressionData,height=400,width=600).mark_point().encode(x=alt.X('VS_2856Bin3:Q',title='Voxel Size (µm)'),y=alt.Y('Diameter:Q',title='Diameter (mm)')).transform_regression('VS_2856Bin3', 'Diameter').mark_line(color='#2ca02c',opacity=0.8)
-    plotVS_Diam1920B3 = alt.Chart(RegressionData,height=400,width=600).mark_point().encode(x=alt.X('VS_1920Bin3:Q',title='Voxel Size (µm)'),y=alt.Y('Diameter:Q',title='Diameter (mm)')).transform_regression('VS_1920Bin3', 'Diameter').mark_line(color='#98df8a',opacity=0.8)
-    plot=plotVS_Diam2856B1 + plotVS_Diam1920B1 +plotVS_Diam2856B2 + plotVS_Diam1920B2 + plotVS_Diam2856B3 + plotVS_Diam1920B3
-    if radio3=='1x' and radio4=='1920':
-       st.session_state['voxelSize']=int(0.5627*st.session_state['diameter']-0.5293)             #linear correlations ######## in the future the coeficients could be calculated automatically using scipy
-       markPoint=pd.DataFrame({'VS':[st.session_state['voxelSize']],'Diam':[st.session_state['diameter']]})   # Red Dot in the plot, coordinates along respective line
-       st.session_state['DataSize']=11
-    if radio3=='1x' and radio4=='2856':
-       st.session_state['voxelSize']=int(0.3626*st.session_state['diameter']+0.0151)
-       markPoint=pd.DataFrame({'VS':[st.session_state['voxelSize']],'Diam':[st.session_state['diameter']]})
-       st.session_state['DataSize']=32
-    if radio3=='2x' and radio4=='1920':
-       st.session_state['voxelSize']=int(1.1254*st.session_state['diameter'] -1.0585)       
-       markPoint=pd.DataFrame({'VS':[st.session_state['voxelSize']],'Diam':[st.session_state['diameter']]})
-       st.session_state['DataSize']=1.4
-    if radio3=='2x' and radio4=='2856':
-       st.session_state['voxelSize']=int(0.7236*st.session_state['diameter']+0.4404)       
-       markPoint=pd.DataFrame({'VS':[st.session_state['voxelSize']],'Diam':[st.session_state['diameter']]})
-       st.session_state['DataSize']=4.3
-    if radio3=='3x' and radio4=='1920':
-       st.session_state['voxelSize']=int(1.6881*st.session_state['diameter']-1.5878)
-       markPoint=pd.DataFrame({'VS':[st.session_state['voxelSize']],'Diam':[st.session_state['diameter']]})
-       st.session_state['DataSize']=0.4
-    if radio3=='3x' and radio4=='2856':
-        st.session_state['voxelSize']=int(1.1254*st.session_state['diameter']-1.0585)        
-        markPoint=pd.DataFrame({'VS':[st.session_state['voxelSize']],'Diam':[st.session_state['diameter']]})
-        st.session_state['DataSize']=1.2
-    plotMark = alt.Chart(markPoint,height=400,width=600).mark_point(color='red',size=120,fill='red').encode(x=alt.X('VS:Q',title='Voxel Size (µm)'),y=alt.Y('Diam:Q',title='Diameter (mm)'))
-    plotAndMark=plot+plotMark
-    st.altair_chart(plotAndMark,use_container_width=False)  
+    geometry=node('geometry')
+    st.session_state['voxelSize']=geometry['voxelSize']
+    st.session_state['DataSize']=geometry['DataSize']
+    plot=xct_charts.geometry_chart(st.session_state['voxelSize'],st.session_state['diameter'],scanner)
+    st.altair_chart(plot,use_container_width=False)  
+    if metrics:
+        xct_metrics.payload('geometry_chart',xct_metrics.payload_size(plot))
      
+@st.cache_data(max_entries=32) # long-form data of the selected phases, the database is identified by the snapshot version
+def attenuationData(version, phases, _database):
+    return xct_charts.attenuation_data(_database,phases)
 def attenuation_energy():
     ############## Plot Attenuation in the Composition Tab ###############################
-    plot1= alt.Chart(database,width='container',height=400
-                     ).mark_line(color='lightblue').encode(x=alt.X('Energy (kV):Q').scale(domain=(10,180)),
-                                                           y=alt.Y(menuPhase1,title='Attenuation Coefficient (cm-1)').scale(type="log")).interactive()
-    plot2= alt.Chart(database,width='container',height=400
-                     ).mark_line(color='green').encode(x=alt.X('Energy (kV):Q').scale(domain=(10,180)),
-                                                           y=alt.Y(menuPhase2,title='Attenuation Coefficient (cm-1)').scale(type="log")).interactive()
-    plot3= alt.Chart(database,width='container',height=400
-                     ).mark_line(color='orange').encode(x=alt.X('Energy (kV):Q').scale(domain=(10,180)),
-                                                           y=alt.Y(menuPhase3,title='Attenuation Coefficient (cm-1)').scale(type="log")).interactive()
-    plot4= alt.Chart(database,width='container',height=400
-                     ).mark_line(color='red').encode(x=alt.X('Energy (kV):Q').scale(domain=(10,180)),
-                                                           y=alt.Y(menuPhase4,title='Attenuation Coefficient (cm-1)').scale(type="log")).interactive()  
-    plot=plot1 + plot2 + plot3 + plot4      
+    plot=xct_charts.attenuation_chart(attenuationData(databaseVersion['version'],tuple(menuPhases),database),menuPhases)
     st.altair_chart(plot,use_container_width=True)
+    if metrics:
+        xct_metrics.payload('attenuation_chart',xct_metrics.payload_size(plot))
 def transmission():
-    ########### Lambert-Beer law applied to the seleted phases, volume fractions and sample diameter
-    attPhase1= database[menuPhase1]
-    transm1=np.exp(-attPhase1*inFracPhase1*slideDiameter/10)
-    attPhase2= database[menuPhase2]
-    transm2=np.exp(-attPhase2*inFracPhase2*slideDiameter/10)
-    attPhase3= database[menuPhase3]
-    transm3=np.exp(-attPhase3*inFracPhase3*slideDiameter/10)
-    attPhase4= database[menuPhase4]
-    transm4=np.exp(-attPhase4*inFracPhase4*slideDiameter/10)
-    totalTransm=transm1*transm2*transm3*transm4*100
-    energy= database['Energy (kV)']
-    ########################### Automatically calculates the filter #############################################
-    attFilter= database['Cu']
-    newAttFilt=[]
-    newTotalTransm=[]
-    newEnergy=[]
-    i=0
-    for t in totalTransm:
-        tempEi=energy[i]      
-        if t>0.001 and tempEi<310 and i<5:           # uses a narrow range of values, excludes transmissions close to 0 and high energies where the transmission is constant with the energy. 
-            newTotalTransm.append(t)
-            newEnergy.append(energy[i])
-            newAttFilt.append(attFilter[i])
-        if i>=5 and tempEi<310:                      # guarantees at least 5 datapoints to prevent error of the curve fit
-            newTotalTransm.append(t)
-            newEnergy.append(energy[i])
-            newAttFilt.append(attFilter[i])
-        i=i+1
-    def EnVSTransm_function(x, a, b,c,d,e,f,g):
-        return (a+b*x+c*x*x+d*x*x*x+g*x*x*x*x)/(e*x+f*x*x+1)
-    params, covariance = curve_fit(EnVSTransm_function, newTotalTransm, newEnergy)
-    a, b,c,d,e,f,g= params
-    energyAt10percTransm=EnVSTransm_function(10,a, b,c,d,e,f,g)         # Calculates the energy at the point where the transmission through the sample is 10 percent (ideal case)
-    energyAt1percTransm=EnVSTransm_function(1,a, b,c,d,e,f,g)           # Calculates the energy at the point where the transmission through the sample is 1 percent (fast case)
-    def AttVSEn_function(x, a, b,c,d,e,f,g):
-        return b+f*x+g*x*x/(b+c*x+a*x*x+d*x*x*x+e*x*x*x*x*x)
-    params, covariance = curve_fit(AttVSEn_function, newEnergy, newAttFilt)
-    a,b,c,d,e,f,g= params
-    attCoefFiltAt10percTransm=AttVSEn_function(energyAt10percTransm,a,b,c,d,e,f,g)      # Calculates the attenuation coef. at energy with 10 % transmission (ideal case)
-    attCoefFiltAt1percTransm=AttVSEn_function(energyAt1percTransm,a,b,c,d,e,f,g)        # Calculates the attenuation coef. at energy with 1 % transmission (fast case)
-    ################ calculates the filter thickness for the selected option #####################
+    ########### Lambert-Beer law applied to the seleted phases, volume fractions and sample diameter (composition node)
+    ########### and filter thickness for the selected option (filter node)
+    composition=node('composition')
+    filtering=node('filter')
+    st.session_state['filterThickness']=filtering['filterThickness']
     if radioFilter=='Ideal':
-        st.session_state['filterThickness']=-(np.log(0.2)*10)/attCoefFiltAt10percTransm
-        if st.session_state['filterThickness']>2.5:
+        if filtering['lowTransmission']:
            st.write('**WARNING:** low transmission')
-           st.session_state['filterThickness']=2.5
         st.write('Reference Filter Thickness (mm of Cu)', round(st.session_state['filterThickness'],1))
     if radioFilter=='No Filter':
-        st.session_state['filterThickness']=0
         st.write('**WARNING:** Potential artifacts, No Filter')
     if radioFilter=='Fast':
-        st.session_state['filterThickness']=-(np.log(0.5)*10)/attCoefFiltAt1percTransm  
         if st.session_state['filterThickness']<0.05:
             st.write('No filter necessary')
         else:
             st.write('Reference Filter Thickness (mm of Cu)',round(st.session_state['filterThickness'],1))
 
-    transmFilter=np.exp(-attFilter*st.session_state['filterThickness']/10)*100
-    totalTransmFilter=totalTransm*transmFilter/100
     ###################### Plot total transmission ########################################
-    TotalTransm4Plot={'Energy (kV)':energy,'Sample':totalTransm,'Filter':transmFilter, 'Filter+Sample':totalTransmFilter}
+    TotalTransm4Plot={'Energy (kV)':phaseTable.energy,'Sample':composition['totalTransm'],'Filter':filtering['transmFilter'], 'Filter+Sample':filtering['totalTransmFilter']}
     dfTotalTransm4Plot=pd.DataFrame(TotalTransm4Plot)
-    plotSample= alt.Chart(dfTotalTransm4Plot,width='container',height=400
-                    ).mark_line(color='green').encode(x=alt.X('Energy (kV):Q').scale(domain=(20,180)),
-                                                            y=alt.Y('Sample',title='Total Transmission (%)').scale(domain=(0,100))).interactive()
-    plotSample_Filter=alt.Chart(dfTotalTransm4Plot,width='container',height=400
-                    ).mark_line(color='orange').encode(x=alt.X('Energy (kV):Q').scale(domain=(20,180)),
-                                                            y=alt.Y('Filter+Sample',title='Total Transmission (%)').scale(domain=(0,100))).interactive()
-    plotFilter=alt.Chart(dfTotalTransm4Plot,width='container',height=400
-                ).mark_line(color='lightblue').encode(x=alt.X('Energy (kV):Q').scale(domain=(20,180)),
-                                                        y=alt.Y('Filter',title='Total Transmission (%)').scale(domain=(0,100))).interactive()
-    plot=plotSample+plotSample_Filter+plotFilter
+    plot=xct_charts.transmission_chart(xct_charts.transmission_data(dfTotalTransm4Plot))
     st.altair_chart(plot,use_container_width=True)
-    return dfTotalTransm4Plot, energyAt10percTransm
+    if metrics:
+        xct_metrics.payload('transmission_chart',xct_metrics.payload_size(plot))
+    return dfTotalTransm4Plot
 
 ##################### Calculates the minimum feature of interest for the sidebar ############################
 def updateMinFeature():
-    if radio1=='Qualitative':
-        st.session_state['minimumFeature']=st.session_state['voxelSize']*3
-    if radio1=='Quantify':
-        st.session_state['minimumFeature']=st.session_state['voxelSize']*5
-    if radio1=='Classify':
-       st.session_state['minimumFeature']=st.session_state['voxelSize']*7
+    st.session_state['minimumFeature']=node('geometry')['minimumFeature']
+
+############################ Calculation of time using empirical equations ################################
+#Unused time equation with binning as input 
+#scanTime=(0.61*st.session_state['filterThickness']-0.0109*st.session_state['maximumEnergy']-1.3*resolutionFactor-0.0148*st.session_state['voxelSize']+5.65)*cameraFactor   #Bin1+Bin2+Bin3
+def showTime():
+    time=node('time')
+    sidebarEmax.metric(':violet[Maximum Energy (kV)]',st.session_state['maximumEnergy'],help='Input with the slider in the tab :violet["Composition Parameter"]. Tip: 1) If contrast is not a problem aim at high kV, 2) At Emax, the transmission should be at least 10percent ')
+    ############### Transmission of the whole spectrum of the tube through the filter and the sample ###########################
+    spectrumTable=st.session_state['inputs']['spectrumTable']
+    spectrum=node('spectrum')
+    effective,hardening=(spectrumTable.lookup(spectrum[key],st.session_state['maximumEnergy'],node('filter')['filterThickness'])
+                         for key in ('effectiveTransmission','beamHardening'))
+    if np.isnan(effective):
+        sidebarSpectrum.metric(':violet[Effective Transmission (%)]','-',help='No x-rays bellow the lowest energy of the database, increase the Maximum Energy')
+    else:
+        sidebarSpectrum.metric(':violet[Effective Transmission (%)]',round(float(effective),1),delta=f'{float(hardening):+.0f} kV beam hardening',delta_color='off',
+                               help='Transmission of the whole x-ray spectrum (tube at the Maximum Energy and filter) through the sample. Beam hardening: increase of the mean energy of the spectrum through the sample, large values cause cupping artifacts')
+    ############### Sets a warning for low counts ###########################
+    if time['lowCounts']:
+        sidebarCounts.title(':red[WARNING:] Limited counts, reduce sample diameter')
+    else:
+        sidebarCounts.empty()
+    if time['longScan']:
+        sidebarTime.metric(':red[Experiment Time (hrs)]',time['experimentTime'])
+    else: 
+        sidebarTime.metric(':green[Experiment Time (hrs)]',time['experimentTime'],help='It includes 12 min for every scan (to warmup and setting up the scan). Other tricks can be used to speedup the scan, ask a CT expert') 
+    ############### Percentiles of the Monte Carlo draws of the uncertainty mode ###########################
+    if uncertaintyMode:
+        with xct_metrics.stage('uncertainty'):
+            bands=node('uncertainty')
+        low,median,high=xct_uncertainty.PERCENTILES
+        sidebarUncertainty.markdown(f':grey[Percentiles {low} - {median} - {high} of {xct_uncertainty.DRAWS} draws]  \n'
+                                    +'  \n'.join(f"{label}: `{bands[key][0]:.{digits}f}` - `{bands[key][1]:.{digits}f}` - `{bands[key][2]:.{digits}f}`"
+                                                  for label,key,digits in ((':violet[Filter Thickness (mm of Cu)]','filterThickness',2),
+                                                                           (':violet[Energy at 10% transmission (kV)]','energyAt10percTransm',0),
+                                                                           (':green[Experiment Time (hrs)]','experimentTime',1))))
+    else:
+        sidebarUncertainty.empty()
+
+@st.experimental_fragment # the maximum energy only affects the time node: moving the slider reruns this function, not the whole page
+def maximumEnergy():
+    testEmax=st.slider('Maximum Energy (kV)', value=160, min_value=0, max_value=180, step=5,help='Tip: aim at a 160 kV, only use lower if necessary for good contrast')
+    st.session_state['maximumEnergy']=testEmax
+    st.session_state['inputs']['maximumEnergy']=testEmax
+    with xct_metrics.run('maximumEnergy',metrics,fragmentRerun()):
+        showTime()
 
 ############################ Controls the display in the tab geometry ################################
 with tabGeometry:
+    ########### the options of binning and detector width come from the profile of the scanner (see xct_scanners.py)
+    if len(xct_engine.SCANNERS.names)>1:
+        scanner=st.selectbox('Scanner',options=xct_engine.SCANNERS.names,index=xct_engine.SCANNERS.names.index(xct_engine.DEFAULT_SCANNER),
+                             help='Profiles of the scanners of the facility, see the folder scanners')
+    else:
+        scanner=xct_engine.DEFAULT_SCANNER
+    scannerProfile=xct_engine.SCANNERS.profiles[scanner]
+    binningOptions=[f'{b}x' for b in sorted(scannerProfile['binnings'])]
+    detectorOptions=[str(d) for d in sorted(scannerProfile['detectors'],reverse=True)]
     colDiam, colPurpose, colBin,colCam = st.columns(4, gap='large')
     with colDiam:
         st.subheader('Sample Diameter (mm)')
         slideDiameter= st.slider(' ', value=20, max_value=150, step=1,help='Larger diameters worsen the resolution. If the sample is irregular input the largest cross-section')
         st.session_state['diameter']=slideDiameter
+        st.session_state['inputs']['diameter']=slideDiameter
     with colPurpose:
         st.subheader('Purpose of Study')
         radio1=st.radio(label='   ',options=['Qualitative','Quantify','Classify'], help='What kind of information do you need to answer your scientific question?')
     with colBin:
         st.subheader('Binning')
-        radio3=st.radio(label=' ',options=['1x','2x','3x'], help='2x is recommended. Higher binning decreases the scanning time, image artefacts and data size, but worsens voxel size',index=1)
+        radio3=st.radio(label=' ',options=binningOptions, help='2x is recommended. Higher binning decreases the scanning time, image artefacts and data size, but worsens voxel size',
+                        index=binningOptions.index(f"{scannerProfile['defaults']['binning']}x"))
     with colCam:
         st.subheader('Detector width (px)')
-        radio4=st.radio(label=' ',options=['2856','1920'],index=1,help='"1920" recommended if very dense phases are present and if the purpose is "Quantify" or "Classify". Smaller detectors decrease cone beam artifacts. Note that other values are possible, the two options are just a guide')
+        radio4=st.radio(label=' ',options=detectorOptions,index=detectorOptions.index(str(scannerProfile['defaults']['detector'])),help='"1920" recommended if very dense phases are present and if the purpose is "Quantify" or "Classify". Smaller detectors decrease cone beam artifacts. Note that other values are possible, the two options are just a guide')
+    binning=int(radio3[:-1])
+    detector=int(radio4)
+    st.session_state['inputs'].update(scanner=scanner,purpose=radio1,binning=binning,detector=detector)
     st.divider()
     st.text('   ') #just some space
-    vs_diameter()
+    with xct_metrics.stage('geometry'):
+        vs_diameter()
     updateMinFeature()
     st.write(':grey[Each line represents a detector setting. The red dot highlights the selected setting]')
 
@@ -250,31 +295,46 @@ st.sidebar.metric(':blue[Minimum Feature Size (um)]', st.session_state['minimumF
 st.sidebar.metric(':blue[Data Size (Gb)]',st.session_state['DataSize'],
                   help='Expected size of the reconstructed 3D image. Relative to binning 1x, binning 2x generates 8x and binning 3x generates 27x smaller images')
 
+############################ Controls the sidebar ################################
+st.sidebar.title('  ') #just some space
+st.sidebar.title(':violet[Contrast]', 
+                 help='Contrast is reflected in the grey-scale of the different phases in the final image. It can be estimated by the difference in the attenuation curves within the energies boundaries [minimum transmissible energy, Emax], see Attenuation plot in the tab :violet["Composition"]')
+sidebarEmax=st.sidebar.container().empty()      # filled by showTime(), placeholders inside containers can be written by a fragment
+sidebarSpectrum=st.sidebar.container().empty()
+sidebarCounts=st.sidebar.container().empty()
+st.sidebar.title(' ') #just some space
+st.sidebar.title(':green[Time]',
+                 help='Tip: longer scans usually mean higher quality, which means less image processing time. Restric the time only if it is a time-lapse experiment or the access to the scanner is limited')
+inNumbScans= st.sidebar.number_input(':green[Number of scans]', value=1, min_value=1, max_value=100, step=1, 
+                                     help='this should acount for 1) how many samples, 2) how many scans per sample, e.g if the sample height> 0.8 x diameter. :red[IMPORTANT: Only aim at as many samples as you can realistically analyse]. Rule of thumb: processing 1 scan takes at least 1 days for qualitative studies and 1 week for quantitative studies')
+st.session_state['inputs']['numberScans']=inNumbScans
+sidebarTime=st.sidebar.container().empty()
+uncertaintyMode=st.sidebar.toggle('Uncertainty',help=f'The volume fractions and the diameter are rough guesses and the equations are approximations: {xct_uncertainty.DRAWS} plausible '
+                                  f'samples (volume fractions, diameter ±{xct_uncertainty.DIAMETER_UNCERTAINTY:.0%}, attenuation coefficients ±{xct_uncertainty.ATTENUATION_UNCERTAINTY:.0%}) '
+                                  f'and time equations (coefficients ±{xct_uncertainty.TIME_UNCERTAINTY:.0%}) are evaluated, the range shows the lowest, median and highest values (5th, 50th and 95th percentile)')
+sidebarUncertainty=st.sidebar.container().empty()
+
 ############################ Controls the display in the tab Composition ################################
 with tabComposition:
     col1,col2,col3=st.columns(3,gap='large')
     with col1:
         st.subheader('Main phases', help='The phases of interest are the ones that must be distinguished to answer the scientific question. Tip: if the sample has a complex matrix group the phases into classes of similar attenuation')
-        menuPhase1=st.selectbox(label=':blue[Phase1]',options=allPhases,index=1)
-        menuPhase2=st.selectbox(label=':green[Phase2]',options=allPhases,index=2) 
-        menuPhase3=st.selectbox(label=':orange[Phase3]',options=allPhases,index=1)
-        menuPhase4=st.selectbox(label=':red[Phase4]',options=allPhases,index=1)    
+        menuPhases=st.multiselect(label='Phases',options=allPhases,default=allPhases[:2],
+                                  help='Any number of phases can be combined, the colors match the lines in the Attenuation plot')
     with col2:
         st.subheader('Volume fractions', 
                   help='If you are an x-ray crossing the sample, how much yould you need to cross of each phase (values 0-1 and the sum of all phases should be 1-porosity)')
-        inFracPhase1= st.number_input('Phase1 Volume Fraction (0-1)', value=0.0, min_value=0.0, max_value=1.0, step=0.02)
-        inFracPhase2= st.number_input('Phase2 Volume Fraction (0-1)', value=0.0, min_value=0.0, max_value=1.0, step=0.02)
-        inFracPhase3= st.number_input('Phase3 Volume Fraction (0-1)', value=0.0, min_value=0.0, max_value=1.0, step=0.02)
-        inFracPhase4= st.number_input('Phase4 Volume Fraction (0-1)', value=0.0, min_value=0.0, max_value=1.0, step=0.02)
-        porosity= int((1-inFracPhase1-inFracPhase2-inFracPhase3-inFracPhase4)*100)    
+        inFracPhases=[st.number_input(f'{phase} Volume Fraction (0-1)', value=0.0, min_value=0.0, max_value=1.0, step=0.02, key=f'fraction_{phase}')
+                      for phase in menuPhases]
+        porosity= int((1-sum(inFracPhases))*100)    
         st.write('Porosity (%):',porosity) #help='1 minus the sum of the volume fractions. Air is assumed to have attenuation coefficient =0'
     with col3:
         st.subheader('X-ray energy', 
                   help='The x-ray energy spectra ranges from the energy for which the transmission is above approx. 5% (blue curve) and the input "maximum energy"')
         radioFilter=st.radio(label='Filter',options=['No Filter','Fast','Ideal'],index=2, help='The type of filter is decided based on the transmission through the sample - depends on the diameter and composition. Ideal, is recommended for quantitative studies. Fast, could be sufficient for qualitative studies')
+        st.session_state['inputs'].update(phases=tuple(menuPhases),fractions=tuple(inFracPhases),filterMode=radioFilter)
         st.text('   ') #just some space
-        testEmax=st.slider('Maximum Energy (kV)', value=160, min_value=0, max_value=180, step=5,help='Tip: aim at a 160 kV, only use lower if necessary for good contrast')
-        st.session_state['maximumEnergy']=testEmax
+        maximumEnergy()
 
     ############################ Display plots ################################
     st.divider()
@@ -282,80 +342,91 @@ with tabComposition:
     with col4:
         st.subheader('Total transmission',
                   help='Percent of x-rays that penetrate through the :blue[Filter (light blue)], the :green[Sample (green)] and the :orange[Sample + Filter (orange)] at various energies')
-        dfTotalTransm4Plot2, energyAt10percTransm = transmission()
+        with xct_metrics.stage('transmission'):
+            dfTotalTransm4Plot2 = transmission()
         st.write(':green[Sample]  -  :blue[Filter]  -  :orange[Sample+Filter]')
-        with st.expander('Transmission Table'):
-            st.table(dfTotalTransm4Plot2)    
+        with xct_metrics.stage('transmission_table'):
+            pagedTable('Transmission Table',dfTotalTransm4Plot2,'transmission_table')
+        if st.toggle('Compare with curve fit', help='Deviation of the filter calculation from the curve fit used in previous versions of the app (slower, the fit may not converge for some compositions)'):
+            with xct_metrics.stage('curve_fit'):
+                deviation=xct_engine.fit_deviation(dfTotalTransm4Plot2['Energy (kV)'],dfTotalTransm4Plot2['Sample'],phaseTable[xct_engine.FILTER_PHASE],radioFilter)
+            st.table(pd.DataFrame(deviation).T.astype(float).round(3))
+            if metrics:
+                xct_metrics.fit(xct_engine.fit_diagnostics(dfTotalTransm4Plot2['Energy (kV)'],dfTotalTransm4Plot2['Sample'],phaseTable[xct_engine.FILTER_PHASE]))
     with col5:
         st.subheader('Attenuation',
                   help='Energies with large difference between curves give better contrast. Note: if the curves are matching the phases will have similar greyvalues in the final image)')
-        attenuation_energy()
+        with xct_metrics.stage('attenuation_chart'):
+            attenuation_energy()
         st.write(':grey[Each line corresponds to a phase selected with the same color]')
-        with st.expander('Database of attenuation coefficients'):
-            st.table(database)
+        ############### Energy window with the best contrast between the selected phases ###########################
+        contrast=node('contrast')
+        if contrast is None and len(set(menuPhases))>1:
+            st.write('**WARNING:** the sample does not transmit enough x-rays to compare the phases, reduce sample diameter')
+        elif contrast is not None:
+            st.write(f"Best contrast between `{contrast['lower']:.0f}` and `{contrast['upper']:.0f}` kV (Maximum Energy `{contrast['maximumEnergy']:.0f}` kV): "
+                     f"`{contrast['contrast']*100:.0f}`% between the closest phases, {' and '.join(contrast['weakestPair'])}")
+            for first,second in contrast['indistinguishable']:
+                st.write(f'**WARNING:** {first} and {second} are hard to distinguish at any energy')
+        with xct_metrics.stage('database_table'):
+            pagedTable('Database of attenuation coefficients',database,'database_table')
+        st.caption(f"Snapshot v{databaseVersion['version']} of {pd.Timestamp(databaseVersion['created'],unit='s'):%Y-%m-%d %H:%M} UTC")
 
-############################ Controls the sidebar ################################
-st.sidebar.title('  ') #just some space
-st.sidebar.title(':violet[Contrast]', 
-                 help='Contrast is reflected in the grey-scale of the different phases in the final image. It can be estimated by the difference in the attenuation curves within the energies boundaries [minimum transmissible energy, Emax], see Attenuation plot in the tab :violet["Composition"]')
-st.sidebar.metric(':violet[Maximum Energy (kV)]',st.session_state['maximumEnergy'],help='Input with the slider in the tab :violet["Composition Parameter"]. Tip: 1) If contrast is not a problem aim at high kV, 2) At Emax, the transmission should be at least 10percent ')
-
-############################ Calculation of time using empirical equations ################################
-if st.session_state['voxelSize']<15:      # this is specific of the CoreTom: the power (W) equals the voxel size except bellow 15um.
-    power = 15
-else:
-    power = st.session_state['voxelSize']
-if radio3=='1x' and radio4=='1920':
-    cameraFactor=1 # this camera was used as reference
-    resolutionFactor=1
-    scanTime=round((1.38*st.session_state['filterThickness']-0.0198*st.session_state['maximumEnergy']-0.0328*power+6.048)*cameraFactor,1)
-if radio3=='2x' and radio4=='1920':
-    cameraFactor=1
-    resolutionFactor=2
-    scanTime=round((0.68*st.session_state['filterThickness']-0.0109*st.session_state['maximumEnergy']-0.0152*power+2.607)*cameraFactor,1)
-if radio3=='3x' and radio4=='1920':
-    cameraFactor=1
-    resolutionFactor=3 
-    scanTime=round((0.328*st.session_state['filterThickness']-0.0055*st.session_state['maximumEnergy']-0.0068*power+1.19)*cameraFactor,1)
-if radio3=='1x' and radio4=='2856':
-    cameraFactor=1.4875
-    resolutionFactor=1
-    scanTime=round((1.38*st.session_state['filterThickness']-0.0198*st.session_state['maximumEnergy']-0.0328*power+6.048)*cameraFactor,1)
-if radio3=='2x' and radio4=='2856':
-    cameraFactor=1.4875
-    resolutionFactor=2
-    scanTime=round((0.68*st.session_state['filterThickness']-0.0109*st.session_state['maximumEnergy']-0.0152*power+2.607)*cameraFactor,1)
-if radio3=='3x' and radio4=='2856':
-    cameraFactor=1.4875
-    resolutionFactor=3
-    scanTime=round((0.328*st.session_state['filterThickness']-0.0055*st.session_state['maximumEnergy']-0.0068*power+1.19)*cameraFactor,1)
-if scanTime<0.1:
-    scanTime=0.1
-#Unused time equation with binning as input 
-#scanTime=(0.61*st.session_state['filterThickness']-0.0109*st.session_state['maximumEnergy']-1.3*resolutionFactor-0.0148*st.session_state['voxelSize']+5.65)*cameraFactor   #Bin1+Bin2+Bin3
-
-############### Sets a warning for low counts ###########################
-if energyAt10percTransm>st.session_state['maximumEnergy']:
-    st.sidebar.title(':red[WARNING:] Limited counts, reduce sample diameter')
-st.sidebar.title(' ') #just some space
-st.sidebar.title(':green[Time]',
-                 help='Tip: longer scans usually mean higher quality, which means less image processing time. Restric the time only if it is a time-lapse experiment or the access to the scanner is limited')
-inNumbScans= st.sidebar.number_input(':green[Number of scans]', value=1, min_value=1, max_value=100, step=1, 
-                                     help='this should acount for 1) how many samples, 2) how many scans per sample, e.g if the sample height> 0.8 x diameter. :red[IMPORTANT: Only aim at as many samples as you can realistically analyse]. Rule of thumb: processing 1 scan takes at least 1 days for qualitative studies and 1 week for quantitative studies')
-experimentTime=round((scanTime+0.2)*inNumbScans,1) # adds 0.2 hrs to account for warmup?
+############################ Controls the display in the tab Planner ################################
+@st.cache_data(max_entries=64) # the search only depends on its inputs, the phase table is identified by the snapshot version
+def searchSettings(version, _phaseTable, phases, fractions, purpose, minimumFeature, timeBudget, numberScans, diameter, filterModes, scanners):
+    xct_metrics.cache('planner_search',False)          # only runs on a miss
+    return xct_planner.search(_phaseTable,phases,fractions,purpose,minimumFeature,timeBudget,numberScans,diameter,filterModes,scanners=scanners)
 
-if radio3=='1x' and radio4=='2856' and scanTime>6.2:
-    st.sidebar.metric(':red[Experiment Time (hrs)]',experimentTime) 
-elif radio3=='2x' and radio4=='2856' and scanTime>3.2:
-    st.sidebar.metric(':red[Experiment Time (hrs)]',experimentTime)
-elif radio3=='3x' and radio4=='2856' and scanTime>2.2:
-    st.sidebar.metric(':red[Experiment Time (hrs)]',experimentTime)
-elif radio3=='1x' and radio4=='1920' and scanTime>4.2:
-    st.sidebar.metric(':red[Experiment Time (hrs)]',experimentTime) 
-elif radio3=='2x' and radio4=='1920' and scanTime>2.2:
-    st.sidebar.metric(':red[Experiment Time (hrs)]',experimentTime)
-elif radio3=='3x' and radio4=='1920' and scanTime>1.5:
-    st.sidebar.metric(':red[Experiment Time (hrs)]',experimentTime)
-else: 
-    st.sidebar.metric(':green[Experiment Time (hrs)]',experimentTime,help='It includes 12 min for every scan (to warmup and setting up the scan). Other tricks can be used to speedup the scan, ask a CT expert') 
+@st.experimental_fragment # changing the targets of the search does not rerun the rest of the app
+def planner():
+    colTarget,colBudget,colFilters=st.columns(3,gap='large')
+    with colTarget:
+        st.subheader('Target Minimum Feature (um)')
+        inTargetFeature=st.number_input('  ',value=max(st.session_state['minimumFeature'],1),min_value=1,step=1,
+                                        help='The largest acceptable Minimum Feature Size, for the Purpose of Study selected in the :blue["Geometric Parameters"] tab')
+    with colBudget:
+        st.subheader('Time budget (hrs)')
+        inTimeBudget=st.number_input('   ',value=8.0,min_value=0.1,step=0.5,help='Maximum Experiment Time for the :green[Number of scans] in the sidebar')
+    with colFilters:
+        st.subheader('Filter options')
+        inFilterModes=st.multiselect('    ',options=xct_engine.FILTER_MODES,default=['Fast','Ideal'])
+        compareScanners=len(xct_engine.SCANNERS.names)>1 and st.toggle('Compare scanners',help='Search the settings of all the scanners in the same table')
+    with xct_metrics.run('planner',metrics,fragmentRerun()), xct_metrics.cached('planner_search'):
+        settings=searchSettings(databaseVersion['version'],phaseTable,tuple(menuPhases),tuple(inFracPhases),radio1,inTargetFeature,inTimeBudget,
+                                inNumbScans,slideDiameter,tuple(inFilterModes),xct_engine.SCANNERS.names if compareScanners else (scanner,))
+    st.write(f':grey[The sample diameter is reduced (up to the {slideDiameter} mm of the :blue["Geometric Parameters"] tab) until the target is resolved. '
+             f'{len(settings)} settings are within the budget, the table shows the optimal ones (Pareto front of Minimum Feature Size and Experiment Time vs Diameter) ranked by Experiment Time and Data Size]')
+    if settings.empty:
+        st.write('**WARNING:** no setting reaches the target within the time budget, consider a larger Minimum Feature or a longer budget')
+    else:
+        showAll=st.toggle('Show all the settings within the budget')
+        st.dataframe(settings if showAll else settings[settings['Pareto']],hide_index=True,use_container_width=True,
+                     column_config={'Filter Thickness (mm of Cu)':st.column_config.NumberColumn(format='%.2f')})
+with tabPlanner:
+    planner()
 
+############################ Debug panel (only with ?debug=1) ################################
+if metrics:
+    record=xct_metrics.finish_run()
+    if debug:
+        with st.expander('Debug'):
+            st.write(f"Rerun: `{record['duration']*1000:.0f}` ms")
+            st.table(pd.DataFrame({'Duration (ms)':pd.Series(record['stages'])*1000}).round(1))
+            colCaches,colPayloads=st.columns(2)
+            with colCaches:
+                st.write('Caches')
+                st.table(pd.DataFrame(record['caches']).T)
+            with colPayloads:
+                st.write('Payloads')
+                st.table(pd.DataFrame({'Size (kB)':pd.Series(record['payloads'],dtype=float)/1000}).round(1))
+            if record['fits']:
+                st.write('Curve fit')
+                st.table(pd.DataFrame(record['fits']))
+            st.write('JSON log line')
+            st.code(xct_metrics.json_line(record),language='json')
+            if xct_metrics.ENABLED:
+                st.write('Prometheus (all the sessions since the server started)')
+                st.code(xct_metrics.REGISTRY.prometheus_text(),language='text')
+            else:
+                st.caption('Set XCT_METRICS=1 to aggregate every rerun and export them (XCT_METRICS_LOG, XCT_METRICS_PORT)')
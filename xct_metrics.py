@@ -0,0 +1,250 @@
+#Opt-in instrumentation of the app: duration of the named stages of every rerun, cache hits/misses, payload sizes of the
+#elements sent to the browser and diagnostics of the legacy curve fit. Every rerun is a record that can be written as one JSON
+#log line, and all the records are aggregated in a process-wide registry exported in the Prometheus text format.
+#Nothing is recorded unless a run was started (debug panel) or XCT_METRICS is set.
+import contextlib
+import contextvars
+import http.server
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+import pandas as pd
+
+logger=logging.getLogger(__name__)
+
+ENABLED=os.environ.get('XCT_METRICS','').lower() in ('1','true','yes')    # record every rerun of every session
+LOG=os.environ.get('XCT_METRICS_LOG','')                                  # file for the JSON lines, '-' for stdout
+PORT=int(os.environ.get('XCT_METRICS_PORT',0))                            # serve /metrics (Prometheus) on this port
+PREFIX='xct_'
+DURATION_BUCKETS=(0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10)          # seconds
+SIZE_BUCKETS=(1e3,1e4,1e5,1e6,1e7)                                         # bytes
+RESIDUAL_BUCKETS=(0.001,0.01,0.1,1,10,100)
+
+class Registry:
+    ########### cumulative counters and histograms {(name, labels): ...}, labels is a sorted tuple of (key, value)
+    def __init__(self):
+        self._lock=threading.Lock()
+        self.counters={}
+        self.histograms={}
+        self.buckets={}
+
+    def count(self, name, value=1, **labels):
+        key=(name,tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key]=self.counters.get(key,0)+value
+
+    def observe(self, name, value, buckets=DURATION_BUCKETS, **labels):
+        key=(name,tuple(sorted(labels.items())))
+        with self._lock:
+            counts,total,number=self.histograms.get(key,([0]*len(buckets),0.0,0))
+            counts=[c+(value<=bound) for c,bound in zip(counts,buckets)]
+            self.histograms[key]=(counts,total+value,number+1)
+            self.buckets.setdefault(name,buckets)
+
+    def prometheus_text(self):
+        ########### exposition format 0.0.4, histograms with cumulative buckets
+        lines=[]
+        with self._lock:
+            counters=sorted(self.counters.items())
+            histograms=sorted(self.histograms.items())
+        declared=set()
+        for (name,labels),value in counters:
+            if name not in declared:
+                lines.append(f'# TYPE {PREFIX}{name} counter')
+                declared.add(name)
+            lines.append(f'{PREFIX}{name}{_labels(labels)} {value}')
+        for (name,labels),(counts,total,number) in histograms:
+            if name not in declared:
+                lines.append(f'# TYPE {PREFIX}{name} histogram')
+                declared.add(name)
+            for bound,count in zip(self.buckets[name],counts):
+                lines.append(f'{PREFIX}{name}_bucket{_labels(labels+(("le",_number(bound)),))} {count}')
+            lines.append(f'{PREFIX}{name}_bucket{_labels(labels+(("le","+Inf"),))} {number}')
+            lines.append(f'{PREFIX}{name}_sum{_labels(labels)} {_number(total)}')
+            lines.append(f'{PREFIX}{name}_count{_labels(labels)} {number}')
+        return '\n'.join(lines)+'\n'
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{'+','.join(f'{key}="{_escape(value)}"' for key,value in labels)+'}'
+
+def _escape(value):
+    return str(value).replace('\\','\\\\').replace('"','\\"').replace('\n','\\n')
+
+def _number(value):
+    return repr(float(value)) if math.isfinite(value) else ('+Inf' if value>0 else '-Inf' if value<0 else 'NaN')
+
+REGISTRY=Registry()
+
+class Run:
+    ########### record of one rerun of the script (or of a fragment)
+    def __init__(self, name):
+        self.name=name
+        self.started=time.time()
+        self.stages={}                   # stage: seconds, repeated stages add up
+        self.caches={}                   # cache: {'hit': n, 'miss': n}
+        self.payloads={}                 # element: bytes
+        self.fits=[]                     # diagnostics of the curve fits
+        self.duration=None
+        self.result=None                 # 'ok', or 'aborted' if the rerun did not reach its end
+
+    def record(self):
+        return {'run':self.name,'result':self.result,'time':self.started,'duration':self.duration,'stages':self.stages,
+                'caches':self.caches,'payloads':self.payloads,'fits':self.fits}
+
+_current=contextvars.ContextVar('xct_metrics_run',default=None)     # every session reruns the script in its own thread
+
+def current():
+    return _current.get()
+
+def start_run(name='script'):
+    ########### a run left open by an aborted rerun (st.stop() or a new rerun of the session before the end of the script) is
+    ########### closed first, so it is still counted instead of absorbing the stages of the next reruns
+    if _current.get() is not None:
+        finish_run('aborted')
+    run=Run(name)
+    _current.set(run)
+    return run
+
+def finish_run(result='ok'):
+    ########### closes the current run, adds it to the registry and writes the JSON line. Returns the record
+    run=_current.get()
+    if run is None:
+        return None
+    _current.set(None)
+    run.duration=time.time()-run.started
+    run.result=result
+    if ENABLED:
+        REGISTRY.count('reruns_total',run=run.name,result=result)
+        REGISTRY.observe('rerun_duration_seconds',run.duration,run=run.name,result=result)
+        for stage,seconds in run.stages.items():
+            REGISTRY.observe('stage_duration_seconds',seconds,stage=stage)
+        for cache,results in run.caches.items():
+            for result,number in results.items():
+                REGISTRY.count('cache_requests_total',number,cache=cache,result=result)
+        for element,size in run.payloads.items():
+            REGISTRY.observe('payload_bytes',size,SIZE_BUCKETS,element=element)
+        for fit in run.fits:
+            for curve in ('energy','filter'):
+                REGISTRY.count('curve_fit_total',curve=curve,result='converged' if fit[f'{curve}Converged'] else 'failed')
+                if fit[f'{curve}Converged']:
+                    REGISTRY.observe('curve_fit_rms_residual',fit[f'{curve}Residual'],RESIDUAL_BUCKETS,curve=curve)
+        write_line(run.record())
+    return run.record()
+
+@contextlib.contextmanager
+def run(name, enabled=True, rerun=False):
+    ########### a run for a fragment, inside of a full rerun it is just a stage of it. rerun: the fragment reruns on its own,
+    ########### an open run can then only be left by an aborted rerun of the script and it is closed (see start_run)
+    if not enabled:
+        yield None
+        return
+    if _current.get() is not None and not rerun:
+        with stage(name):
+            yield _current.get()
+        return
+    started=start_run(name)
+    try:
+        yield started
+    finally:
+        finish_run()
+
+@contextlib.contextmanager
+def stage(name):
+    ########### duration of a named stage. Without a run it is recorded directly in the registry if XCT_METRICS is set
+    ########### (e.g. the background refresh of the database)
+    run=_current.get()
+    if run is None and not ENABLED:
+        yield
+        return
+    start=time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds=time.perf_counter()-start
+        if run is not None:
+            run.stages[name]=run.stages.get(name,0.0)+seconds
+        else:
+            REGISTRY.observe('stage_duration_seconds',seconds,stage=name)
+
+def cache(name, hit):
+    run=_current.get()
+    if run is not None:
+        results=run.caches.setdefault(name,{'hit':0,'miss':0})
+        results['hit' if hit else 'miss']+=1
+
+def payload(name, size):
+    run=_current.get()
+    if run is not None:
+        run.payloads[name]=run.payloads.get(name,0)+int(size)
+
+@contextlib.contextmanager
+def cached(name):
+    ########### counts a hit unless a miss of the same cache was recorded inside, e.g. by the body of a function cached with
+    ########### st.cache_data, which only runs on a miss
+    run=_current.get()
+    misses=run.caches.get(name,{}).get('miss',0) if run is not None else 0
+    yield
+    if run is not None and run.caches.get(name,{}).get('miss',0)==misses:
+        cache(name,True)
+
+def fit(diagnostics):
+    run=_current.get()
+    if run is not None:
+        run.fits.append(diagnostics)
+
+def payload_size(element):
+    ########### bytes sent to the browser: Arrow table for DataFrames (st.table/st.dataframe), Vega-Lite json for charts
+    if isinstance(element,pd.DataFrame):
+        import pyarrow
+        return pyarrow.Table.from_pandas(element).nbytes
+    return len(element.to_json())
+
+############################################## Export ######################################################
+def _finite(value):
+    ########### nan and inf are not valid json
+    if isinstance(value,dict):
+        return {key:_finite(item) for key,item in value.items()}
+    if isinstance(value,(list,tuple)):
+        return [_finite(item) for item in value]
+    if isinstance(value,float) and not math.isfinite(value):
+        return None
+    return value
+
+def json_line(record):
+    return json.dumps(_finite(record),default=float)
+
+def write_line(record):
+    line=json_line(record)
+    logger.info(line)
+    if LOG=='-':
+        print(line,file=sys.stdout,flush=True)
+    elif LOG:
+        with open(LOG,'a') as file:
+            file.write(line+'\n')
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0]!='/metrics':
+            self.send_error(404)
+            return
+        body=REGISTRY.prometheus_text().encode()
+        self.send_response(200)
+        self.send_header('Content-Type','text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length',str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(port=PORT):
+    ########### Prometheus endpoint http://<host>:<port>/metrics in a daemon thread
+    server=http.server.ThreadingHTTPServer(('',port),_Handler)
+    threading.Thread(target=server.serve_forever,name='xct-metrics',daemon=True).start()
+    return server
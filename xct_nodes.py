@@ -0,0 +1,86 @@
+#Computation nodes of the app with explicit inputs. A node is recomputed only when one of its inputs changed since its last
+#evaluation, otherwise the cached result is returned, so e.g. a change of the maximum energy only reruns the time node.
+import xct_engine
+import xct_uncertainty
+
+class Node:
+    def __init__(self, name, function, inputs):
+        self.name=name
+        self.function=function
+        self.inputs=tuple(inputs)                     # names of other nodes or of external inputs (widgets), passed in order
+
+class Graph:
+    def __init__(self, *nodes):
+        self.nodes={node.name:node for node in nodes}
+
+    def evaluate(self, name, inputs, cache, recomputed=None):
+        ########### result of the node, inputs holds the external inputs and cache the last {node: (arguments, result)}.
+        ########### Results of other nodes are compared by identity, so a node reruns only if an upstream node did.
+        ########### The names of the recomputed nodes are appended to recomputed
+        node=self.nodes[name]
+        arguments={key:self.evaluate(key,inputs,cache,recomputed) if key in self.nodes else inputs[key] for key in node.inputs}
+        if name in cache:
+            previous,result=cache[name]
+            if all(previous[key] is value or (key not in self.nodes and _equal(previous[key],value)) for key,value in arguments.items()):
+                return result
+        result=node.function(*arguments.values())
+        cache[name]=(arguments,result)
+        if recomputed is not None:
+            recomputed.append(name)
+        return result
+
+def _equal(a, b):
+    try:
+        return bool(a==b)
+    except ValueError:                                  # arrays
+        return False
+
+############################################## Nodes of the app ######################################################
+def geometry_node(scanner, diameter, binning, detector, purpose):
+    voxelSize=int(xct_engine.voxel_size(diameter,binning,detector,scanner))
+    return {'voxelSize':voxelSize,
+            'minimumFeature':int(xct_engine.minimum_feature(voxelSize,purpose)),
+            'DataSize':float(xct_engine.data_size(binning,detector,scanner))}
+
+def composition_node(phaseTable, filterSolver, phases, fractions, diameter):
+    ########### transmission through the sample and the energies/filter coefficients at 10% and 1% transmission
+    energyAt10percTransm,energyAt1percTransm,attCoefFiltAt10percTransm,attCoefFiltAt1percTransm=filterSolver(phases,fractions,diameter)
+    return {'totalTransm':phaseTable.transmission(phases,fractions,diameter),
+            'energyAt10percTransm':energyAt10percTransm,'energyAt1percTransm':energyAt1percTransm,
+            'attCoefFiltAt10percTransm':attCoefFiltAt10percTransm,'attCoefFiltAt1percTransm':attCoefFiltAt1percTransm}
+
+def filter_node(phaseTable, composition, filterMode):
+    filterThickness,lowTransmission=xct_engine.filter_thickness(filterMode,composition['attCoefFiltAt10percTransm'],composition['attCoefFiltAt1percTransm'])
+    transmFilter=xct_engine.filter_transmission(phaseTable[xct_engine.FILTER_PHASE],filterThickness)
+    return {'filterThickness':float(filterThickness),'lowTransmission':bool(lowTransmission),
+            'transmFilter':transmFilter,'totalTransmFilter':composition['totalTransm']*transmFilter/100}
+
+def spectrum_node(spectrumTable, composition):
+    ########### effective transmission and beam hardening of the sample for every Emax step and filter thickness, a change of
+    ########### either is then a lookup
+    return spectrumTable.evaluate(composition['totalTransm'])
+
+def contrast_node(contrastTable, phases, composition):
+    ########### energy window with the best contrast between the selected phases, above the energy at which the sample transmits
+    return contrastTable.best_window(phases,composition['energyAt10percTransm'])
+
+def time_node(geometry, composition, filtering, scanner, binning, detector, maximumEnergy, numberScans):
+    scanTime=float(xct_engine.scan_time(binning,detector,filtering['filterThickness'],maximumEnergy,geometry['voxelSize'],scanner))
+    return {'scanTime':scanTime,
+            'experimentTime':float(xct_engine.experiment_time(scanTime,numberScans,scanner)),
+            'longScan':bool(xct_engine.long_scan(binning,detector,scanTime,scanner)),
+            'lowCounts':bool(composition['energyAt10percTransm']>maximumEnergy)}
+
+def uncertainty_node(phaseTable, scanner, phases, fractions, diameter, binning, detector, purpose, filterMode, maximumEnergy, numberScans):
+    ########### percentiles of the filter thickness, energy at 10% transmission and experiment time of the Monte Carlo draws
+    return xct_uncertainty.bands(xct_uncertainty.simulate(phaseTable,phases,fractions,diameter,binning,detector,purpose,filterMode,
+                                                          maximumEnergy,numberScans,scanner))
+
+APP_GRAPH=Graph(Node('geometry',geometry_node,('scanner','diameter','binning','detector','purpose')),
+                Node('composition',composition_node,('phaseTable','filterSolver','phases','fractions','diameter')),
+                Node('filter',filter_node,('phaseTable','composition','filterMode')),
+                Node('spectrum',spectrum_node,('spectrumTable','composition')),
+                Node('contrast',contrast_node,('contrastTable','phases','composition')),
+                Node('time',time_node,('geometry','composition','filter','scanner','binning','detector','maximumEnergy','numberScans')),
+                Node('uncertainty',uncertainty_node,('phaseTable','scanner','phases','fractions','diameter','binning','detector','purpose',
+                                                     'filterMode','maximumEnergy','numberScans')))
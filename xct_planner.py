@@ -0,0 +1,49 @@
+#Inverse planner: instead of adjusting the settings by hand until the minimum feature and the time are acceptable, all the
+#combinations of binning, detector width, filter option and maximum energy (of one or several scanners) are evaluated in one
+#vectorized call of the engine and the Pareto-optimal settings (minimum feature vs experiment time) are returned.
+import numpy as np
+import pandas as pd
+import xct_engine
+
+ENERGY_GRID=xct_engine.MAXIMUM_ENERGIES          # steps of the Maximum Energy slider (kV)
+MINIMUM_DIAMETER=1                               # mm
+
+def settings_grid(filterModes=xct_engine.FILTER_MODES, scanners=(xct_engine.DEFAULT_SCANNER,)):
+    ########### every combination of scanner, binning, detector width, filter option and maximum energy available on the
+    ########### scanner, as flat arrays
+    grids=[np.meshgrid([scanner],*xct_engine.SCANNERS.options(scanner),list(filterModes),ENERGY_GRID,indexing='ij') for scanner in scanners]
+    return tuple(np.concatenate([grid[i].ravel() for grid in grids]) for i in range(5))
+
+def pareto_front(*objectives):
+    ########### mask of the points that are not dominated by any other point, all the objectives are minimized
+    points=np.stack(objectives,axis=-1)
+    notWorse=(points[None,:,:]<=points[:,None,:]).all(axis=-1)           # [i,j]: j is at least as good as i everywhere
+    better=(points[None,:,:]<points[:,None,:]).any(axis=-1)
+    return ~(notWorse&better).any(axis=1)
+
+def search(phaseTable, phases, fractions, purpose, minimumFeature, timeBudget, numberScans=1, diameter=150,
+           filterModes=xct_engine.FILTER_MODES, allowLowCounts=False, scanners=(xct_engine.DEFAULT_SCANNER,)):
+    ########### the diameter is a continuous variable: every setting scans the largest sample (up to diameter, in mm) that
+    ########### still resolves minimumFeature (um). Returns all the feasible settings within timeBudget (hrs) as a DataFrame,
+    ########### with the Pareto-optimal ones (minimum feature and experiment time vs diameter) flagged and ranked first by
+    ########### experiment time and data size. With several scanners all of them are compared in the same table
+    scanner,binning,detector,filterMode,maximumEnergy=settings_grid(filterModes,scanners)
+    sampleDiameter=np.floor(np.minimum(xct_engine.maximum_diameter(minimumFeature,binning,detector,purpose,scanner),diameter)*10)/10
+    possible=sampleDiameter>=MINIMUM_DIAMETER                              # False also for nan
+    scanner,binning,detector,filterMode,maximumEnergy,sampleDiameter=(a[possible] for a in (scanner,binning,detector,filterMode,maximumEnergy,sampleDiameter))
+    result=xct_engine.plan(sampleDiameter,binning,detector,purpose,phaseTable.weights(phases,fractions),phaseTable.attenuation,
+                           phaseTable.energy,phaseTable[xct_engine.FILTER_PHASE],filterMode,maximumEnergy,numberScans,scanner)
+    feasible=result['experimentTime']<=timeBudget
+    if not allowLowCounts:
+        feasible&=~result['lowCounts']
+    settings=pd.DataFrame({'Binning':binning,'Detector width (px)':detector,'Filter':filterMode,'Maximum Energy (kV)':maximumEnergy,
+                           'Diameter (mm)':sampleDiameter,'Voxel Size (um)':result['voxelSize'],
+                           'Minimum Feature Size (um)':result['minimumFeature'],'Filter Thickness (mm of Cu)':result['filterThickness'],
+                           'Scan Time (hrs)':result['scanTime'],'Experiment Time (hrs)':result['experimentTime'],
+                           'Data Size (Gb)':result['DataSize'],'Low counts':result['lowCounts']})[feasible]
+    if len(scanners)>1:
+        settings.insert(0,'Scanner',scanner[feasible])
+    settings['Pareto']=pareto_front(settings['Minimum Feature Size (um)'].to_numpy(),settings['Experiment Time (hrs)'].to_numpy(),
+                                    -settings['Diameter (mm)'].to_numpy())            # a larger sample is only worth a longer scan
+    return settings.sort_values(['Pareto','Experiment Time (hrs)','Data Size (Gb)','Minimum Feature Size (um)'],
+                                ascending=[False,True,True,True]).reset_index(drop=True)
@@ -0,0 +1,142 @@
+#Scanner profiles: the calibration of the voxel size, the data size and the time model of every scanner are read from json
+#files (scanners/*.json, or the folder or file in XCT_SCANNERS) instead of being hard-coded. The lines voxel size vs diameter
+#are fitted once from the calibration points, the fitted table of all the scanners is cached on disk, and every coefficient
+#is looked up in arrays indexed by [scanner, binning, detector], so several scanners are evaluated side by side in one call.
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import numpy as np
+import xct_database
+
+logger=logging.getLogger(__name__)
+
+FORMAT=1                                                                 # layout of the cache, bump if it changes
+PROFILES=os.environ.get('XCT_SCANNERS',os.path.join(os.path.dirname(os.path.abspath(__file__)),'scanners'))
+CACHE_DIR=os.path.join(xct_database.SNAPSHOT_DIR,'scanners')
+DEFAULT_SCANNER=os.environ.get('XCT_SCANNER','CoreTom')
+ARRAYS=('voxelSlope','voxelIntercept','dataSize','longScanTime',         # [scanner, binning, detector]
+        'timeCoefficients',                                              # [scanner, binning, coefficient]
+        'cameraFactor',                                                  # [scanner, detector]
+        'minimumPower','minimumScanTime','warmupTime')                   # [scanner]
+
+def lookup(values, options, name):
+    ########### converts an array of option values into their index in options
+    values=np.asarray(values)
+    index=np.full(values.shape,-1)
+    for i,option in enumerate(options):
+        index[values==option]=i
+    if (index<0).any():
+        raise ValueError(f'Unknown {name}: {np.unique(values[index<0]).tolist()}, expected one of {list(options)}')
+    return index
+
+def read_profiles(path=PROFILES):
+    ########### the profiles of a json file or of all the json files of a folder, in the order of the file names
+    files=[os.path.join(path,name) for name in sorted(os.listdir(path)) if name.endswith('.json')] if os.path.isdir(path) else [path]
+    profiles=[]
+    for file in files:
+        with open(file) as handle:
+            profiles.append(json.load(handle))
+    if not profiles:
+        raise ValueError(f'No scanner profiles in {path}')
+    names=[profile['name'] for profile in profiles]
+    if len(set(names))<len(names):
+        raise ValueError(f'Repeated scanner names in {path}: {names}')
+    return profiles
+
+def calibration_points(profile):
+    ########### {(binning, detector): voxel sizes of the calibration diameters}. The voxel size is proportional to the
+    ########### binning and to the factor of the detector relative to the detector of the calibration
+    calibration=profile['calibration']
+    voxelSizes=np.asarray(calibration['voxelSizes'],dtype=float)
+    return {(binning,detector):voxelSizes*binning/calibration['binning']*calibration['detectorFactors'][str(detector)]
+            for binning in profile['binnings'] for detector in profile['detectors']}
+
+def fit_voxel_size(profile):
+    ########### slope and intercept (binnings x detectors of the profile) of the linear fit voxel size vs diameter. Explicit
+    ########### coefficients in the profile take precedence (e.g. to reproduce previous versions of the app)
+    if 'voxelSize' in profile:
+        return np.asarray(profile['voxelSize']['slope'],dtype=float),np.asarray(profile['voxelSize']['intercept'],dtype=float)
+    diameters=np.asarray(profile['calibration']['diameters'],dtype=float)
+    points=calibration_points(profile)
+    fitted=np.array([[np.polyfit(diameters,points[binning,detector],1) for detector in profile['detectors']]
+                     for binning in profile['binnings']])
+    return fitted[...,0],fitted[...,1]
+
+class ScannerTable:
+    def __init__(self, profiles, arrays):
+        self.profiles={profile['name']:profile for profile in profiles}
+        self.names=tuple(self.profiles)
+        self.binnings=tuple(sorted({b for profile in profiles for b in profile['binnings']}))
+        self.detectors=tuple(sorted({d for profile in profiles for d in profile['detectors']}))
+        for name in ARRAYS:
+            setattr(self,name,arrays[name])
+
+    @classmethod
+    def fit(cls, profiles):
+        ########### stacks the profiles, binnings and detectors that a scanner does not have are nan
+        binnings=sorted({b for profile in profiles for b in profile['binnings']})
+        detectors=sorted({d for profile in profiles for d in profile['detectors']})
+        shape=(len(profiles),len(binnings),len(detectors))
+        arrays={name:np.full(shape,np.nan) for name in ('voxelSlope','voxelIntercept','dataSize','longScanTime')}
+        arrays['timeCoefficients']=np.full(shape[:2]+(4,),np.nan)
+        arrays['cameraFactor']=np.full((shape[0],shape[2]),np.nan)
+        for s,profile in enumerate(profiles):
+            b=np.array([binnings.index(binning) for binning in profile['binnings']])[:,None]
+            d=np.array([detectors.index(detector) for detector in profile['detectors']])[None,:]
+            arrays['voxelSlope'][s,b,d],arrays['voxelIntercept'][s,b,d]=fit_voxel_size(profile)
+            arrays['dataSize'][s,b,d]=profile['dataSize']
+            arrays['longScanTime'][s,b,d]=profile['longScanTime']
+            arrays['timeCoefficients'][s,b[:,0]]=profile['time']['coefficients']
+            arrays['cameraFactor'][s,d[0]]=profile['time']['cameraFactor']
+        for name in ('minimumPower','minimumScanTime','warmupTime'):
+            arrays[name]=np.array([float(profile['time'][name]) for profile in profiles])
+        return cls(profiles,arrays)
+
+    def index(self, scanner, binning, detector):
+        ########### indices of the arrays, raises ValueError for unknown values or a binning/detector the scanner does not have
+        s=lookup(scanner,self.names,'scanner')
+        b=lookup(binning,self.binnings,'binning')
+        d=lookup(detector,self.detectors,'detector width')
+        missing=np.isnan(self.voxelSlope[s,b,d])
+        if missing.any():
+            s,b,d=np.broadcast_arrays(s,b,d)
+            raise ValueError('Not available: '+', '.join(sorted({f'{self.names[i]} binning {self.binnings[j]} detector {self.detectors[k]}'
+                                                                for i,j,k in zip(s[missing],b[missing],d[missing])})))
+        return s,b,d
+
+    def options(self, scanner):
+        ########### (binnings, detectors) of a scanner
+        profile=self.profiles[scanner]
+        return tuple(profile['binnings']),tuple(profile['detectors'])
+
+def _cache_path(profiles, cacheDir):
+    key=hashlib.sha256(json.dumps([FORMAT,profiles],sort_keys=True).encode()).hexdigest()[:16]
+    return os.path.join(cacheDir,f'scanners-{key}.npz')
+
+def load(path=PROFILES, cacheDir=CACHE_DIR):
+    ########### ScannerTable of the profiles, the fit is cached in cacheDir for every version of the profiles
+    profiles=read_profiles(path)
+    cache=_cache_path(profiles,cacheDir)
+    try:
+        with np.load(cache) as arrays:
+            return ScannerTable(profiles,{name:arrays[name] for name in ARRAYS})
+    except FileNotFoundError:
+        pass
+    except Exception:                                # truncated or corrupt (e.g. zipfile.BadZipFile): fitted again
+        logger.warning('Ignoring the unreadable cache of the scanner profiles %s',cache,exc_info=True)
+    table=ScannerTable.fit(profiles)
+    temporary=None
+    try:
+        os.makedirs(cacheDir,exist_ok=True)
+        ########### unique temporary file, several processes (server, campaign workers) may write the cache at the same time
+        handle,temporary=tempfile.mkstemp(dir=cacheDir,prefix=os.path.basename(cache)+'.',suffix='.tmp')
+        with os.fdopen(handle,'wb') as file:
+            np.savez(file,**{name:getattr(table,name) for name in ARRAYS})
+        os.replace(temporary,cache)
+    except OSError:
+        logger.warning('Could not cache the scanner profiles in %s',cacheDir,exc_info=True)
+        if temporary is not None and os.path.exists(temporary):
+            os.remove(temporary)
+    return table
@@ -0,0 +1,41 @@
+#Monte Carlo uncertainty of the plan: the volume fractions and the diameter of the sample are rough guesses and the time
+#equation is empirical, so thousands of plausible values of them (and of the attenuation coefficients of the database) are
+#drawn and pushed through the Lambert-Beer mixture, the filter selection and the time equation in one call of xct_engine.plan.
+#The result is a band of percentiles instead of a single number, without any loop over the draws.
+import numpy as np
+import xct_engine
+
+DRAWS=10000
+SEED=0                                   # the same draws on every rerun, the bands only move when an input changes
+PERCENTILES=(5,50,95)
+FRACTION_CONCENTRATION=50                # Dirichlet of the phases and the porosity, a fraction of 0.5 varies about +-0.07
+DIAMETER_UNCERTAINTY=0.05                # relative standard deviation of the diameter
+ATTENUATION_UNCERTAINTY=0.03             # relative standard deviation of the attenuation coefficients of each phase
+TIME_UNCERTAINTY=0.05                    # relative standard deviation of each coefficient of the time equation
+QUANTITIES=('filterThickness','energyAt10percTransm','experimentTime')
+
+def draw_fractions(rng, fractions, draws):
+    ########### volume fractions (draws,nPhases) from a Dirichlet around the fractions and the porosity. Phases without volume
+    ########### stay at 0 and the total is kept if the fractions add up to more than 1
+    fractions=np.asarray(fractions,dtype=float)
+    total=max(fractions.sum(),1.0)
+    components=rng.gamma(FRACTION_CONCENTRATION*np.append(fractions,total-fractions.sum())/total,size=(draws,len(fractions)+1))
+    return components[:,:-1]/components.sum(axis=1,keepdims=True)*total
+
+def simulate(phaseTable, phases, fractions, diameter, binning, detector, purpose='Qualitative', filterMode='Ideal',
+             maximumEnergy=160, numberScans=1, scanner=xct_engine.DEFAULT_SCANNER, draws=DRAWS, seed=SEED):
+    ########### plan of every draw {quantity: (draws,)}, see xct_engine.plan
+    rng=np.random.default_rng(seed)
+    rows=phaseTable.rows(list(phases))
+    s,b,_=xct_engine.SCANNERS.index(scanner,binning,detector)
+    ########### the uncertainty of the attenuation of a phase scales its fraction in the mixture (sample_transmission is linear)
+    scale=rng.lognormal(0,ATTENUATION_UNCERTAINTY,(draws,len(rows)))
+    sampleDiameter=np.maximum(diameter*(1+rng.normal(0,DIAMETER_UNCERTAINTY,draws)),np.finfo(float).tiny)
+    timeCoefficients=xct_engine.SCANNERS.timeCoefficients[s,b]*(1+rng.normal(0,TIME_UNCERTAINTY,(draws,4)))
+    return xct_engine.plan(sampleDiameter,binning,detector,purpose,draw_fractions(rng,fractions,draws)*scale,
+                           phaseTable.attenuation[rows],phaseTable.energy,phaseTable[xct_engine.FILTER_PHASE],
+                           filterMode,maximumEnergy,numberScans,scanner,timeCoefficients)
+
+def bands(result, quantities=QUANTITIES, percentiles=PERCENTILES):
+    ########### {quantity: values at the percentiles}
+    return {quantity:np.percentile(result[quantity],percentiles) for quantity in quantities}